@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# Benchmark wall time and peak memory of rnaseq-manifest-generator on a
+# catalogue, e.g. one from extras/generate_synthetic_catalogue.py.
+#
+# Each run is a separate process, so the peak RSS is for that run only.
+#
+# usage:
+#   python3 extras/benchmark_catalogue_loading.py data/ taxid100007 \
+#       --engines c pyarrow
+
+from pathlib import Path
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "catalogue_dir",
+        type=Path,
+        help="Directory with m.packages.csv.gz and m.resources.csv.gz",
+    )
+    parser.add_argument("organism_grouping_key", type=str)
+    parser.add_argument("--engines", nargs="+", default=["c", "pyarrow"])
+    parser.add_argument(
+        "--all_organisms", action="store_true", help="Also benchmark --all_organisms"
+    )
+    return parser.parse_args()
+
+
+def run(command):
+    """Run command and return the wall time in seconds and the peak RSS in MB."""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    _, status, rusage = os.wait4(process.pid, 0)
+    if status != 0:
+        raise subprocess.CalledProcessError(status, command)
+    return time.perf_counter() - start, rusage.ru_maxrss / 1024
+
+
+def main():
+    args = parse_arguments()
+    catalogue = [
+        "--packages",
+        str(Path(args.catalogue_dir, "m.packages.csv.gz")),
+        "--resources",
+        str(Path(args.catalogue_dir, "m.resources.csv.gz")),
+    ]
+    generator = [sys.executable, "-m", "rnaseq_manifest_generator.rnaseq_manifest_generator"]
+
+    print("mode\tengine\twall_s\tpeak_rss_mb")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for engine in args.engines:
+            runs = {
+                "single": [args.organism_grouping_key, str(Path(tmpdir, "manifest.csv"))]
+            }
+            if args.all_organisms:
+                runs["all_organisms"] = ["--all_organisms", str(Path(tmpdir, engine))]
+            for mode, mode_args in runs.items():
+                wall, rss = run([*generator, "--engine", engine, *catalogue, *mode_args])
+                print(f"{mode}\t{engine}\t{wall:.1f}\t{rss:.0f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
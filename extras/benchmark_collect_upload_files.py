@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Benchmark classifying a pipeline output directory for upload, against the
+# original rglob and fnmatch walk.
+#
+# Writes a genomeassembly-like tree with n_files files, about a third of them
+# in *.ktab.* directories, which are excluded. Checks that both walks upload
+# and compress the same files.
+#
+# usage:
+#   python3 extras/benchmark_collect_upload_files.py 1000 10000 100000
+
+from fnmatch import fnmatch
+from pathlib import Path
+from yaml_manifest.layout import _collect_upload_files, get_stage
+import argparse
+import tempfile
+import time
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("n_files", type=int, nargs="+")
+    parser.add_argument("--stage", default="genomeassembly")
+    parser.add_argument("--workers", type=int, default=4)
+    return parser.parse_args()
+
+
+def rglob_collect_upload_files(stage_name, output_dir):
+    """The original implementation."""
+    upload_config = get_stage(stage_name).get("upload", {})
+    exclude_patterns = upload_config.get("exclude_patterns", [])
+    compress_extensions = upload_config.get("compress_extensions", [])
+
+    result = {"upload": [], "compress": [], "exclude": []}
+    for file_path in sorted(output_dir.rglob("*")):
+        if not file_path.is_file():
+            continue
+        rel = str(file_path.relative_to(output_dir))
+        if any(fnmatch(rel, p) or fnmatch(file_path.name, p) for p in exclude_patterns):
+            result["exclude"].append(file_path)
+        elif any(file_path.name.endswith(ext) for ext in compress_extensions):
+            result["compress"].append(file_path)
+        else:
+            result["upload"].append(file_path)
+    return result
+
+
+def write_tree(output_dir, n_files, files_per_dir=100):
+    suffixes = [".txt", ".bed", ".fa", ".png", ".bam", ".stats"]
+    for i in range(n_files):
+        subdir = f"sample{i // (files_per_dir * 10)}/dir{i // files_per_dir}"
+        if i % 3 == 0:
+            subdir += ".ktab.1"
+        file_path = Path(output_dir, subdir, f"file{i}{suffixes[i % len(suffixes)]}")
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.touch()
+
+
+def timed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    args = parse_arguments()
+    print("n_files\twalk\tseconds")
+    for n_files in args.n_files:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_dir = Path(tmpdir, "genomeassembly")
+            write_tree(output_dir, n_files)
+
+            seconds, expected = timed(rglob_collect_upload_files, args.stage, output_dir)
+            print(f"{n_files}\trglob\t{seconds:.3f}", flush=True)
+
+            for workers in sorted({1, args.workers}):
+                seconds, result = timed(
+                    _collect_upload_files, args.stage, output_dir, workers
+                )
+                for category in ("upload", "compress"):
+                    assert result[category] == expected[category], category
+                print(f"{n_files}\tscandir_{workers}\t{seconds:.3f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+# Benchmark compression codecs and levels on genomic text files, to choose
+# the codec, level and block_size in a stage's upload config.
+#
+# Writes FASTA, BED and PAF files like the ones genomeassembly uploads, or
+# uses the files given with --files, and compresses each one with
+# block_gzip.compress_file at every codec and level. Reports the throughput
+# in MB/s of uncompressed data and the compression ratio. Checks that every
+# output reads back as its source.
+#
+# usage:
+#   pip install zstandard
+#   python3 extras/benchmark_compression.py --size_mb 64
+#   python3 extras/benchmark_compression.py --files asm.fa aln.paf
+
+from block_gzip import CODEC_SUFFIXES, compress_file
+from pathlib import Path
+import argparse
+import gzip
+import random
+import tempfile
+import time
+import zstandard
+
+MiB = 1024**2
+
+LEVELS = {"gzip": [1, 3, 6, 9], "zstd": [1, 3, 9, 19]}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=Path, nargs="+")
+    parser.add_argument("--size_mb", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument(
+        "--block_size_mb", type=int, nargs="+", default=[1, 4], dest="block_sizes"
+    )
+    parser.add_argument("--codec", choices=list(LEVELS), nargs="+", default=list(LEVELS))
+    return parser.parse_args()
+
+
+def random_sequence(rng, length):
+    # soft-masked repeats, like an assembly
+    sequence = "".join(rng.choices("ACGT", k=length))
+    repeat = "".join(rng.choices("acgt", k=500))
+    return "".join(
+        repeat if rng.random() < 0.2 else sequence[i : i + 500]
+        for i in range(0, length, 500)
+    )
+
+
+def write_fasta(f, rng, size):
+    i = 0
+    while f.tell() < size:
+        sequence = random_sequence(rng, 100_000)
+        f.write(f">ptg{i:06d}l\n")
+        for j in range(0, len(sequence), 80):
+            f.write(sequence[j : j + 80] + "\n")
+        i += 1
+
+
+def write_bed(f, rng, size):
+    start = 0
+    while f.tell() < size:
+        start += rng.randint(1, 5000)
+        f.write(
+            f"ptg{start // 10_000_000:06d}l\t{start}\t{start + rng.randint(50, 20000)}"
+            f"\tfeature_{start}\t{rng.randint(0, 1000)}\t{rng.choice('+-')}\n"
+        )
+
+
+def write_paf(f, rng, size):
+    while f.tell() < size:
+        query_length = rng.randint(10_000, 5_000_000)
+        query_start = rng.randint(0, query_length // 2)
+        query_end = query_start + rng.randint(1000, query_length // 2)
+        target_start = rng.randint(0, 50_000_000)
+        matches = rng.randint(500, query_end - query_start)
+        f.write(
+            f"ptg{rng.randint(0, 999):06d}l\t{query_length}\t{query_start}"
+            f"\t{query_end}\t{rng.choice('+-')}\tptg{rng.randint(0, 999):06d}l"
+            f"\t{rng.randint(50_000_000, 90_000_000)}\t{target_start}"
+            f"\t{target_start + query_end - query_start}\t{matches}"
+            f"\t{query_end - query_start}\t{rng.choice([0, 60])}"
+            f"\ttp:A:{rng.choice('PS')}\tcm:i:{rng.randint(0, 5000)}"
+            f"\ts1:i:{matches}\tdv:f:{rng.random() / 10:.4f}\trl:i:0\n"
+        )
+
+
+def write_test_files(tmpdir, size):
+    rng = random.Random(1)
+    files = []
+    for name, write in [
+        ("asm.fa", write_fasta),
+        ("asm.dups.bed", write_bed),
+        ("asm.self_aln.paf", write_paf),
+    ]:
+        file_path = Path(tmpdir, name)
+        with open(file_path, "wt") as f:
+            write(f, rng, size)
+        files.append(file_path)
+    return files
+
+
+def read_back(file_path, codec):
+    if codec == "zstd":
+        with open(file_path, "rb") as f:
+            return (
+                zstandard.ZstdDecompressor()
+                .stream_reader(f, read_across_frames=True)
+                .read()
+            )
+    with gzip.open(file_path, "rb") as f:
+        return f.read()
+
+
+def main():
+    args = parse_arguments()
+    print("file\tcodec\tlevel\tblock_size_mb\tMB_per_second\tratio")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = args.files or write_test_files(tmpdir, args.size_mb * MiB)
+        for file_path in files:
+            source = file_path.read_bytes()
+            for codec in args.codec:
+                output_path = Path(tmpdir, f"compressed{CODEC_SUFFIXES[codec]}")
+                for level in LEVELS[codec]:
+                    for block_size in args.block_sizes:
+                        start = time.perf_counter()
+                        compress_file(
+                            file_path,
+                            output_path,
+                            level,
+                            args.threads,
+                            codec=codec,
+                            block_size=block_size * MiB,
+                        )
+                        seconds = time.perf_counter() - start
+                        assert read_back(output_path, codec) == source, file_path
+                        print(
+                            f"{file_path.name}\t{codec}\t{level}\t{block_size}"
+                            f"\t{len(source) / 1e6 / seconds:.1f}"
+                            f"\t{len(source) / output_path.stat().st_size:.2f}",
+                            flush=True,
+                        )
+
+
+if __name__ == "__main__":
+    main()
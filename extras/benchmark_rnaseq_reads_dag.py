@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+# Benchmark manifest lookups and DAG construction for the
+# rnaseq-reads-downloader workflow with synthetic RNA-seq manifests.
+#
+# For each lane count, this times:
+#   - looking up every file with a boolean mask over the manifest (the old
+#     get_download_params / get_sample_and_read_data approach)
+#   - indexing the manifest once and looking up every file in the dicts
+#   - building the rnaseq-reads-downloader DAG (dry run)
+#
+# usage: python3 extras/benchmark_rnaseq_reads_dag.py 1000 10000
+
+from pathlib import Path
+from rnaseq_reads_downloader.rnaseq_reads_downloader import mung_manifest
+from snakemake.api import (
+    SnakemakeApi,
+    ConfigSettings,
+    ResourceSettings,
+    OutputSettings,
+)
+from snakemake.settings.enums import Quietness
+from snakemake_setup import get_snakefile
+from yaml_manifest.models import natural_sort_key
+import argparse
+import pandas as pd
+import tempfile
+import time
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "lanes",
+        type=int,
+        nargs="*",
+        default=[1000, 10000],
+        help="Number of lanes (files) in each synthetic manifest",
+    )
+    parser.add_argument(
+        "--lanes_per_sample", type=int, default=4, help="Lanes per sample and read"
+    )
+    parser.add_argument(
+        "--skip_dag", action="store_true", help="Only benchmark the lookups"
+    )
+    return parser.parse_args()
+
+
+def synthetic_manifest(n_lanes, lanes_per_sample):
+    """A manifest in the rnaseq-manifest-generator format."""
+    rows = []
+    n_samples = max(n_lanes // (2 * lanes_per_sample), 1)
+    for sample in range(n_samples):
+        for lane in range(1, lanes_per_sample + 1):
+            for read_number in ["R1", "R2"]:
+                file_name = f"{sample:06d}_RNA_H2KW5DSX3_S1_L{lane:03d}_{read_number}_001.fastq.gz"
+                rows.append(
+                    {
+                        "experiment.bpa_package_id": f"102.100.100/{sample}",
+                        "bioplatforms_url": f"https://data.bioplatforms.com/dataset/rna-{sample}/resource/{sample}{lane}{read_number}/download/{file_name}",
+                        "file_checksum": f"{sample:016d}{lane:08d}{read_number:>08}",
+                        "file_format": "fastq",
+                        "file_name": file_name,
+                        "lane_number": lane,
+                        "read_number": read_number,
+                        "sample.bpa_sample_id": f"102.100.100/{500000 + sample}",
+                    }
+                )
+    return pd.DataFrame(rows)
+
+
+def time_mask_lookups(manifest_df):
+    start = time.perf_counter()
+    for file_name in manifest_df["file_name"]:
+        manifest_df[manifest_df["file_name"] == file_name].iloc[0].to_dict()
+    for (sample_name, read_number), _ in manifest_df.groupby(
+        ["sample_name", "read_number"]
+    ):
+        sample_data = manifest_df[
+            (manifest_df["sample_name"] == sample_name)
+            & (manifest_df["read_number"] == read_number)
+        ]
+        sample_data.sort_values(
+            by="lane_number", key=lambda x: x.map(natural_sort_key)
+        )
+    return time.perf_counter() - start
+
+
+def time_index_lookups(manifest_df):
+    # Same logic as index_manifest in the Snakefile.
+    start = time.perf_counter()
+    file_rows = {}
+    lanes = {}
+    for row in manifest_df.to_dict("records"):
+        file_rows[row["file_name"]] = row
+        lanes.setdefault((row["sample_name"], row["read_number"]), []).append(
+            (natural_sort_key(row["lane_number"]), row["file_name"])
+        )
+    sample_read_files = {k: [x[1] for x in sorted(v)] for k, v in lanes.items()}
+    for file_name in manifest_df["file_name"]:
+        file_rows[file_name]
+    for key in sample_read_files:
+        sample_read_files[key]
+    return time.perf_counter() - start
+
+
+def time_dag(manifest_records, outdir):
+    snakefile = get_snakefile("rnaseq_reads_downloader")
+    start = time.perf_counter()
+    with SnakemakeApi(
+        OutputSettings(dryrun=True, quiet={Quietness.ALL})
+    ) as snakemake_api:
+        workflow_api = snakemake_api.workflow(
+            snakefile=snakefile,
+            workdir=outdir,
+            resource_settings=ResourceSettings(cores=1),
+            config_settings=ConfigSettings(
+                config={"_manifest_records": manifest_records, "outdir": str(outdir)}
+            ),
+        )
+        workflow_api.dag().execute_workflow(executor="dryrun")
+    return time.perf_counter() - start
+
+
+def main():
+    args = parse_arguments()
+
+    print("lanes\tmask_lookup_s\tindex_lookup_s\tdag_s")
+    for n_lanes in args.lanes:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            manifest_file = Path(tmpdir, "manifest.csv")
+            synthetic_manifest(n_lanes, args.lanes_per_sample).to_csv(manifest_file)
+            manifest_records = mung_manifest(manifest_file)
+            manifest_df = pd.DataFrame(manifest_records)
+
+            mask_time = time_mask_lookups(manifest_df)
+            index_time = time_index_lookups(manifest_df)
+
+            dag_time = float("nan")
+            if not args.skip_dag:
+                dag_time = time_dag(manifest_records, Path(tmpdir, "out").resolve())
+
+            print(f"{len(manifest_df)}\t{mask_time:.3f}\t{index_time:.3f}\t{dag_time:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# Benchmark building the pipeline-result-uploader DAG for large output trees.
+#
+# For each file count, writes the dummy genomeassembly tree with that many
+# synthetic files added, using extras/generate_dummy_assembly_files.sh, then
+# times a dry run of the uploader: classifying the files, planning the
+# uploads and building the DAG. The time per file should stay about the same
+# as the tree grows.
+#
+# usage:
+#   python3 extras/benchmark_uploader_dag.py 1000 10000 100000
+
+from pathlib import Path
+from snakemake.api import (
+    SnakemakeApi,
+    ConfigSettings,
+    ResourceSettings,
+    OutputSettings,
+)
+from snakemake.settings.enums import Quietness
+from snakemake_setup import get_snakefile
+import argparse
+import subprocess
+import tempfile
+import time
+
+GENERATE_FILES = Path(__file__).parent / "generate_dummy_assembly_files.sh"
+MANIFEST = Path(__file__).parent.parent / "test-data" / "dummy_pb.json"
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "n_files",
+        type=int,
+        nargs="*",
+        default=[1000, 10000],
+        help="Number of synthetic files in each tree",
+    )
+    parser.add_argument("--pack_below", type=int, default=0)
+    return parser.parse_args()
+
+
+def uploader_config(workdir, pack_below):
+    # the defaults of pipeline-result-uploader's arguments
+    return {
+        "manifest": str(MANIFEST.resolve()),
+        "receipts_file": str(Path(workdir, "out", "receipts.jsonl")),
+        "stage": ["genomeassembly"],
+        "result_dir": [Path("results/genomeassembly/aBcDe1.6")],
+        "bucket": "benchmark",
+        "RCLONE_REMOTE": "BENCHMARK",
+        "replicate_to": None,
+        "part_size": 64,
+        "max_concurrency": 8,
+        "compress_threads": 2,
+        "parallel_downloads": 4,
+        "pack_below": pack_below,
+        "shard_size": 256,
+        "force": False,
+        "deduplicate": True,
+        "dry_run": True,
+    }
+
+
+def time_dag(workdir, pack_below):
+    snakefile = get_snakefile("pipeline_result_uploader")
+    start = time.perf_counter()
+    with SnakemakeApi(
+        OutputSettings(dryrun=True, quiet={Quietness.ALL})
+    ) as snakemake_api:
+        workflow_api = snakemake_api.workflow(
+            snakefile=snakefile,
+            workdir=workdir,
+            resource_settings=ResourceSettings(cores=4, resources={"compress_jobs": 2}),
+            config_settings=ConfigSettings(config=uploader_config(workdir, pack_below)),
+        )
+        workflow_api.dag().execute_workflow(executor="dryrun")
+    return time.perf_counter() - start
+
+
+def main():
+    args = parse_arguments()
+    print("n_files\tdag_s\tms_per_file")
+    for n_files in args.n_files:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            workdir = Path(tmpdir).resolve()
+            subprocess.run(
+                ["bash", str(GENERATE_FILES), str(n_files)],
+                cwd=workdir,
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+            seconds = time_dag(workdir, args.pack_below)
+            print(f"{n_files}\t{seconds:.3f}\t{seconds / n_files * 1000:.3f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
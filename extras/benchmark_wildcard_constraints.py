@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+# Benchmark wildcard matching and DAG construction for the
+# assembly-data-downloader workflow with synthetic manifests.
+#
+# For each lane count, this times:
+#   - matching every raw path against the old "|".join() constraint and the
+#     compact path_constraint() constraint
+#   - building the assembly-data-downloader DAG (dry run), with the old
+#     "|".join() constraints and with path_constraint()
+#
+# The old constraints are benchmarked with a copy of the Snakefile that
+# defines path_constraint() as the "|".join() it replaced. The old DAG is
+# slow: use --skip_join_dag for large lane counts.
+#
+# usage: python3 extras/benchmark_wildcard_constraints.py 1000 10000 50000
+
+from pathlib import Path
+from snakemake.api import (
+    SnakemakeApi,
+    ConfigSettings,
+    ResourceSettings,
+    OutputSettings,
+)
+from snakemake.settings.enums import Quietness
+from snakemake_setup import path_constraint, get_snakefile
+from yaml_manifest import Manifest
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "lanes",
+        type=int,
+        nargs="*",
+        default=[1000, 10000, 50000],
+        help="Number of lanes in each synthetic manifest",
+    )
+    parser.add_argument(
+        "--lanes_per_package",
+        type=int,
+        default=8,
+        help="Lanes per Hi-C package",
+    )
+    parser.add_argument(
+        "--skip_dag", action="store_true", help="Only benchmark the constraints"
+    )
+    parser.add_argument(
+        "--skip_join_dag",
+        type=int,
+        default=20000,
+        help='Skip the DAG with "|".join() constraints above this many lanes',
+    )
+    return parser.parse_args()
+
+
+def synthetic_manifest(n_lanes, lanes_per_package):
+    """A manifest with one PacBio file and n_lanes paired Hi-C lanes."""
+    read_files = [
+        {
+            "name": "bpa-pacbio-hifi-000000-da000000",
+            "data_type": "PACBIO_SMRT",
+            "single_end": [
+                {
+                    "url": "https://data.bioplatforms.com/dataset/pb/resource/0/download/pb.ccs.bam",
+                    "md5sum": "0" * 32,
+                }
+            ],
+        }
+    ]
+
+    n_packages = max(n_lanes // (2 * lanes_per_package), 1)
+    for i in range(n_packages):
+        name = f"bpa-hi-c-{i:06d}-hmgmjdrxy"
+        package = {"name": name, "data_type": "Hi-C", "r1": [], "r2": []}
+        for lane in range(1, lanes_per_package + 1):
+            for read in ["r1", "r2"]:
+                file_name = f"{i:06d}_HMGMJDRXY_S4_L{lane:03d}_{read.upper()}_001.fastq.gz"
+                package[read].append(
+                    {
+                        "url": f"https://data.bioplatforms.com/dataset/{name}/resource/{i}{lane}{read}/download/{file_name}",
+                        "md5sum": f"{i:016d}{lane:08d}{read:>08}",
+                        "lane_number": f"L{lane:04d}",
+                    }
+                )
+        read_files.append(package)
+
+    return {
+        "assembly_version": 1,
+        "dataset_id": "aBcDe1",
+        "scientific_name": "Benchmarkia syntheticus",
+        "taxon_id": 1,
+        "busco_odb10_dataset_name": "sauropsida",
+        "busco_odb12_dataset_name": "squamata",
+        "read_files": read_files,
+    }
+
+
+def time_constraint(constraint, paths):
+    start = time.perf_counter()
+    # Snakemake wraps each constraint in a named group anchored at the end.
+    regex = re.compile(f"(?P<raw_file>{constraint})$")
+    for path in paths:
+        if not regex.match(path):
+            raise ValueError(f"{path} did not match")
+    return time.perf_counter() - start
+
+
+def join_snakefile(workdir):
+    """A copy of the Snakefile with the "|".join() constraints it used to have."""
+    snakefile = get_snakefile("assembly_data_downloader")
+    text = Path(snakefile).read_text()
+    old_import = "from snakemake_setup import path_constraint\n"
+    assert old_import in text
+    text = text.replace(
+        old_import,
+        "def path_constraint(paths):\n"
+        '    return "|".join(str(x) for x in paths)\n',
+    )
+    join_file = Path(workdir, "Snakefile.join")
+    join_file.write_text(text)
+    return join_file
+
+
+def time_dag(manifest_file, workdir, snakefile):
+    start = time.perf_counter()
+    with SnakemakeApi(
+        OutputSettings(dryrun=True, quiet={Quietness.ALL})
+    ) as snakemake_api:
+        workflow_api = snakemake_api.workflow(
+            snakefile=snakefile,
+            workdir=workdir,
+            resource_settings=ResourceSettings(cores=1),
+            config_settings=ConfigSettings(
+                config={"manifest_file": str(manifest_file)}
+            ),
+        )
+        workflow_api.dag().execute_workflow(executor="dryrun")
+    return time.perf_counter() - start
+
+
+def main():
+    args = parse_arguments()
+    cwd = os.getcwd()
+
+    print(
+        "lanes\tjoin_match_s\tpath_constraint_match_s\tjoin_dag_s"
+        "\tpath_constraint_dag_s"
+    )
+    for n_lanes in args.lanes:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            manifest_file = Path(tmpdir, "manifest.json")
+            with open(manifest_file, "wt") as f:
+                json.dump(synthetic_manifest(n_lanes, args.lanes_per_package), f)
+
+            with open(manifest_file, "rb") as f:
+                manifest = Manifest.model_validate_json(f.read())
+            raw_paths = [str(x) for x in manifest.reads.all_raw_paths]
+
+            join_time = time_constraint("|".join(raw_paths), raw_paths)
+            constraint_time = time_constraint(path_constraint(raw_paths), raw_paths)
+
+            join_dag_time = float("nan")
+            dag_time = float("nan")
+            if not args.skip_dag:
+                if len(raw_paths) <= args.skip_join_dag:
+                    join_dag_time = time_dag(
+                        manifest_file, Path(tmpdir), join_snakefile(tmpdir)
+                    )
+                    os.chdir(cwd)
+                dag_time = time_dag(
+                    manifest_file,
+                    Path(tmpdir),
+                    get_snakefile("assembly_data_downloader"),
+                )
+                os.chdir(cwd)
+
+            print(
+                f"{len(raw_paths)}\t{join_time:.3f}\t{constraint_time:.3f}"
+                f"\t{join_dag_time:.3f}\t{dag_time:.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+# A local stand-in for the Data Portal's CKAN API, for testing metadata
+# prefetching. Serves package_show JSON for every package in a manifest and
+# logs each request, so you can check there's one request per package.
+#
+# usage:
+#   python3 extras/ckan_stub_server.py test-data/dummy_pb.json --port 8765 &
+#   assembly-data-downloader --ckan_url http://localhost:8765 test-data/dummy_pb.json
+#
+# Dry runs (-n) skip the prefetch.
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from yaml_manifest import Manifest
+import argparse
+import json
+import zlib
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("manifest", help="Manifest to serve metadata for")
+    parser.add_argument("--port", type=int, default=8765)
+    return parser.parse_args()
+
+
+def build_packages(manifest):
+    packages = {}
+    for bpa_file in manifest.reads.all_bpa_files:
+        package = packages.setdefault(
+            bpa_file.package_id, {"name": bpa_file.package_id, "resources": []}
+        )
+        package["resources"].append(
+            {
+                "id": bpa_file.resource_id,
+                "name": bpa_file.url.rsplit("/", 1)[1],
+                "url": bpa_file.url,
+                # deterministic dummy size
+                "size": zlib.crc32(bpa_file.url.encode()) % 10**9,
+                "md5": bpa_file.md5sum,
+                "last_modified": "2026-01-01T00:00:00",
+            }
+        )
+    return packages
+
+
+def make_handler(packages):
+    class PackageShowHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            package_id = parse_qs(url.query).get("id", [None])[0]
+            if url.path.endswith("/package_show") and package_id in packages:
+                status = 200
+                body = {"success": True, "result": packages[package_id]}
+            else:
+                status = 404
+                body = {"success": False, "error": {"message": "Not found"}}
+
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return PackageShowHandler
+
+
+def main():
+    args = parse_arguments()
+    with open(args.manifest, "rb") as f:
+        manifest = Manifest.model_validate_json(f.read())
+
+    packages = build_packages(manifest)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(packages))
+    print(f"Serving {len(packages)} packages on port {args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,17 @@
 
 # Create a minimal dummy genomeassembly output directory for testing
 # Covers: upload as-is, compress before upload, exclude
+#
+# usage: generate_dummy_assembly_files.sh [n_synthetic_files]
+#
+# With n_synthetic_files, also writes that many small files under
+# synthetic/, a quarter of them to compress, to scale the tree up for
+# benchmarks.
 
 set -euo pipefail
 
+n_synthetic="${1:-0}"
+
 base="results/genomeassembly/aBcDe1.6"
 rm -rf "$base"
 
@@ -107,6 +115,18 @@ write_dummy "$base/kmer/k31/long/.rSaiEqu1.long.k31_fk.ktab.1"
 write_dummy "$base/kmer/k31/long/.rSaiEqu1.long.k31_fk.ktab.2"
 write_dummy "$base/kmer/k31/long/.rSaiEqu1.long.k31_fk.ktab.3"
 
+# --- Synthetic files, to scale the tree up ---
+
+# 100 files per directory, 100 directories per sample
+extensions=(txt bed png stats)
+for ((i = 0; i < n_synthetic; i++)); do
+    dir="$base/synthetic/sample$((i / 10000))/dir$((i / 100))"
+    if ((i % 100 == 0)); then
+        mkdir -p "$dir"
+    fi
+    echo "dummy_${RANDOM}_file${i}" >"$dir/file${i}.${extensions[i % 4]}"
+done
+
 echo "Created test fixture at $base"
 echo ""
 echo "Expected counts:"
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+# Generate synthetic mapped packages and mapped resources CSVs in the
+# atol-bpa-datamapper format, for testing and benchmarking
+# rnaseq-manifest-generator without the real catalogue.
+#
+# usage:
+#   python3 extras/generate_synthetic_catalogue.py --organisms 5000 data/
+
+from pathlib import Path
+import argparse
+import csv
+import gzip
+import random
+
+_LIBRARY_STRATEGIES = ["RNA-Seq", "RNA-Seq", "WGS", "Hi-C", "WGS", "AMPLICON"]
+_FILE_FORMATS = ["fastq", "fastq", "fastq", "bam", "md5", "xlsx"]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("outdir", type=Path, help="Directory for the CSVs")
+    parser.add_argument("--organisms", type=int, default=1000)
+    parser.add_argument("--packages_per_organism", type=int, default=10)
+    parser.add_argument("--resources_per_package", type=int, default=8)
+    parser.add_argument(
+        "--extra_columns",
+        type=int,
+        default=40,
+        help="Unused metadata columns in each CSV, like the real export",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    rng = random.Random(args.seed)
+    args.outdir.mkdir(parents=True, exist_ok=True)
+
+    package_extra = [f"experiment.extra_field_{i}" for i in range(args.extra_columns)]
+    resource_extra = [f"resource.extra_field_{i}" for i in range(args.extra_columns)]
+
+    packages_csv = gzip.open(Path(args.outdir, "m.packages.csv.gz"), "wt", newline="")
+    resources_csv = gzip.open(Path(args.outdir, "m.resources.csv.gz"), "wt", newline="")
+
+    with packages_csv, resources_csv:
+        packages = csv.writer(packages_csv)
+        resources = csv.writer(resources_csv)
+        packages.writerow(
+            [
+                "organism.organism_grouping_key",
+                "organism.scientific_name",
+                "experiment.bpa_package_id",
+                "experiment.library_strategy",
+                "sample.bpa_sample_id",
+                *package_extra,
+            ]
+        )
+        resources.writerow(
+            [
+                "experiment.bpa_package_id",
+                "id",
+                "file_name",
+                "file_format",
+                "read_number",
+                "lane_number",
+                "file_checksum",
+                "bioplatforms_url",
+                "size",
+                *resource_extra,
+            ]
+        )
+
+        package_number = 0
+        for organism in range(args.organisms):
+            organism_key = f"taxid{100000 + organism}"
+            for _ in range(args.packages_per_organism):
+                package_number += 1
+                package_id = f"{300000 + package_number}"
+                packages.writerow(
+                    [
+                        organism_key,
+                        f"Synthetic species {organism}",
+                        package_id,
+                        rng.choice(_LIBRARY_STRATEGIES),
+                        f"102.100.100/{500000 + package_number}",
+                        *(f"value {rng.random():.6f}" for _ in package_extra),
+                    ]
+                )
+                for resource in range(args.resources_per_package):
+                    file_format = rng.choice(_FILE_FORMATS)
+                    lane = resource // 2 + 1
+                    read_number = f"R{resource % 2 + 1}" if file_format == "fastq" else ""
+                    file_name = f"{package_id}_L{lane:03d}_{read_number or 'X'}_{resource}.{file_format}"
+                    checksum = f"{rng.getrandbits(128):032x}"
+                    resources.writerow(
+                        [
+                            package_id,
+                            checksum,
+                            file_name,
+                            file_format,
+                            read_number,
+                            lane,
+                            checksum,
+                            f"https://data.bioplatforms.com/dataset/bpa-{package_id}/resource/{checksum}/download/{file_name}",
+                            rng.randint(10**6, 10**10),
+                            *(f"value {rng.random():.6f}" for _ in resource_extra),
+                        ]
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+
+# Test s3_upload.UploadEngine against a local S3 stand-in (moto), without
+# credentials for a real object store.
+#
+# Uploads a mix of small and multipart files concurrently, then checks every
+# object's content and every receipt. Then checks that verification catches a
+# changed object, both with the stored SHA-256 and with the ETag fallback, and
+# that the upload ledger only skips files that are unchanged and still in the
+# bucket. Then packs files into tar shards and reads each one back with a
+# ranged GET. Then adds the receipts to a receipt store and queries them.
+# Then kills a process partway through a multipart upload, and checks that the
+# next upload resumes it and only sends the missing parts. Finally, checks that
+# a file with the same content as an uploaded one is copied in the bucket, that
+# the engine's inventory of the bucket matches a plain listing, that files
+# and shard members compressed with zstd read back as their sources, and that
+# a fan-out upload sends each file and shard to two buckets, recording both
+# even when a third destination fails.
+#
+# usage:
+#   pip install "moto[server]" zstandard
+#   python3 extras/test_s3_upload_engine.py
+
+from moto.server import ThreadedMotoServer
+from pathlib import Path
+from s3_upload import (
+    ChecksumMismatchError,
+    FanOutEngine,
+    ReceiptStore,
+    UploadEngine,
+    UploadLedger,
+    make_s3_client,
+    read_receipts,
+    receipt_line,
+)
+from s3_upload.resume import MultipartState
+from s3_upload.shards import plan_shards
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import zstandard
+
+MiB = 1024**2
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=5127)
+    parser.add_argument("--bucket", default="test-bucket")
+    return parser.parse_args()
+
+
+def write_test_files(tmpdir):
+    """Files either side of the 5 MiB part size, plus a few small ones."""
+    sizes = [0, 1, 1000, 5 * MiB, 5 * MiB + 1, 17 * MiB + 3]
+    files = {}
+    for i, size in enumerate(sizes):
+        local_path = Path(tmpdir, f"dir{i % 2}", f"file{i}.bin")
+        local_path.parent.mkdir(exist_ok=True)
+        local_path.write_bytes(os.urandom(size))
+        files[local_path] = f"results/genomeassembly/{local_path.parent.name}/{local_path.name}"
+    return files
+
+
+def check_verification(engine, client, bucket):
+    body = b"original content"
+    expected = {
+        "sha256": base64.b64encode(hashlib.sha256(body).digest()).decode(),
+        "etag": hashlib.md5(body).hexdigest(),
+    }
+
+    # Objects uploaded without a checksum are verified with the ETag
+    client.put_object(Bucket=bucket, Key="verify/etag", Body=body)
+    assert "ChecksumSHA256" not in client.head_object(
+        Bucket=bucket, Key="verify/etag", ChecksumMode="ENABLED"
+    )
+    engine.verify_object("verify/etag", expected)
+
+    for key, checksum_args in [
+        ("verify/etag", {}),
+        ("verify/sha256", {"ChecksumAlgorithm": "SHA256"}),
+    ]:
+        client.put_object(Bucket=bucket, Key=key, Body=b"changed", **checksum_args)
+        try:
+            engine.verify_object(key, expected)
+        except ChecksumMismatchError as e:
+            print(f"Caught changed object: {e}")
+        else:
+            raise AssertionError(f"Changed object {key} was not detected")
+
+
+def check_ledger(engine, client, bucket, tmpdir):
+    ledger = UploadLedger(Path(tmpdir, "upload_ledger.json"))
+    files = {}
+    for name, compress in [("plain.txt", False), ("packed.txt", True)]:
+        local_path = Path(tmpdir, "ledger", name)
+        local_path.parent.mkdir(exist_ok=True)
+        local_path.write_bytes(os.urandom(1000))
+        files[local_path] = (f"ledger/{name}", compress)
+        engine.upload_file(local_path, f"ledger/{name}", compress, ledger=ledger)
+    ledger.save()
+
+    def unchanged(local_path):
+        remote_path, compress = files[local_path]
+        return UploadLedger(ledger.ledger_file).unchanged_receipt(
+            local_path,
+            engine.receipt(remote_path, None),
+            compress,
+            engine.list_objects("ledger/"),
+        )
+
+    for local_path in files:
+        assert unchanged(local_path), local_path
+        # a new mtime alone means the file is hashed, not uploaded
+        os.utime(local_path)
+        assert unchanged(local_path), local_path
+
+    plain, packed = files
+    plain.write_bytes(os.urandom(1000))
+    assert unchanged(plain) is None
+    client.delete_object(Bucket=bucket, Key=files[packed][0])
+    assert unchanged(packed) is None
+
+
+def check_shards(engine, client, bucket, files, tmpdir):
+    ledger = UploadLedger(Path(tmpdir, "shard_ledger.json"))
+    members = [
+        (local_path, remote_path, i % 2 == 1)
+        for i, (local_path, remote_path) in enumerate(files.items())
+    ]
+    shards = plan_shards(members, 6 * MiB)
+    assert len(shards) > 1
+    for name, shard in shards.items():
+        receipts = engine.upload_shard(shard, f"shards/{name}.tar", ledger=ledger)
+        index = json.loads(
+            client.get_object(Bucket=bucket, Key=f"shards/{name}.tar.index.json")[
+                "Body"
+            ].read()
+        )
+        assert len(index["members"]) == len(shard) == len(receipts) - 2
+        for (local_path, remote_path, compress), receipt in zip(shard, receipts[2:]):
+            assert receipt["member_path"] == remote_path
+            start, size = receipt["member_offset"], receipt["member_size"]
+            body = b""
+            if size:
+                body = client.get_object(
+                    Bucket=bucket,
+                    Key=receipt["location_path"],
+                    Range=f"bytes={start}-{start + size - 1}",
+                )["Body"].read()
+            assert hashlib.sha256(body).hexdigest() == receipt["sha256sum"]
+            if compress:
+                body = gzip.decompress(body)
+            assert body == local_path.read_bytes(), remote_path
+            # members are skipped while they and the shard are unchanged
+            assert ledger.unchanged_receipt(
+                local_path,
+                {**receipts[0], "member_path": remote_path},
+                compress,
+                engine.list_objects("shards/"),
+            ) == receipt
+    print(f"Packed {len(members)} files in {len(shards)} shards")
+
+    # a new file only changes the shard it's added to
+    new_file = Path(tmpdir, "new_member")
+    new_file.write_bytes(os.urandom(1000))
+    new_shards = plan_shards(members + [(new_file, "a/new_member", False)], 6 * MiB)
+    unchanged = [k for k, v in new_shards.items() if shards.get(k) == v]
+    assert len(unchanged) == len(shards) - 1, (shards, new_shards)
+
+
+def check_receipt_store(receipts, tmpdir):
+    store_path = Path(tmpdir, "receipts.sqlite")
+    with ReceiptStore(store_path) as store:
+        store.add(receipts, stage="test", dataset_id="test1")
+        # adding the same receipts again replaces them
+        store.add(receipts, stage="test", dataset_id="test1")
+        assert store.find(stage="test") == sorted(
+            receipts, key=lambda x: x["location_path"]
+        )
+        for receipt in receipts:
+            assert store.find(sha256sum=receipt["sha256sum"]) == [receipt]
+            assert store.find(location_path=receipt["location_path"]) == [receipt]
+        assert not store.find(stage="other")
+
+        # receipts in the old format are converted when they are loaded
+        legacy_jsonl = Path(tmpdir, "legacy.jsonl")
+        with open(legacy_jsonl, "wt") as f:
+            for receipt in receipts:
+                legacy = {
+                    "endpoint": receipt["endpoint"],
+                    "bucket": "legacy",
+                    "remote_path": receipt["location_path"],
+                    "sha256sum": receipt["sha256sum"],
+                }
+                f.write(json.dumps(legacy) + "\n")
+        assert store.load_jsonl(legacy_jsonl) == len(receipts)
+        assert len(store.find(location_root="legacy")) == len(receipts)
+
+        export_jsonl = Path(tmpdir, "export.jsonl")
+        assert store.export_jsonl(export_jsonl, dataset_id="test1") == len(receipts)
+        assert list(read_receipts(export_jsonl).values()) == store.find(
+            dataset_id="test1"
+        )
+    print(f"Stored and queried {len(receipts)} receipts")
+
+
+# Uploads one file with resumable multipart uploads, one part at a time
+UPLOAD_PROCESS = """
+import sys
+from s3_upload import UploadEngine
+with UploadEngine.from_rclone_env(
+    sys.argv[1], "TEST", part_size=5 * 1024**2, max_concurrency=1,
+    adaptive_concurrency=False, resume_dir=sys.argv[4],
+) as engine:
+    engine.upload_file(sys.argv[2], sys.argv[3])
+"""
+
+
+class _PartCountingEngine(UploadEngine):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parts_sent = 0
+
+    def _upload_part(self, *args):
+        self.parts_sent += 1
+        return super()._upload_part(*args)
+
+
+def check_resume(client, bucket, tmpdir):
+    local_path = Path(tmpdir, "resume", "large.bin")
+    local_path.parent.mkdir()
+    local_path.write_bytes(os.urandom(100 * MiB))
+    remote_path = "resume/large.bin"
+    resume_dir = Path(tmpdir, "resume", "multipart_uploads")
+
+    def sent_parts():
+        try:
+            state = MultipartState(resume_dir).load(bucket, remote_path)
+        except FileNotFoundError:
+            return 0
+        return 0 if state is None else len(state["parts"])
+
+    process = subprocess.Popen(
+        [sys.executable, "-c", UPLOAD_PROCESS]
+        + [bucket, str(local_path), remote_path, str(resume_dir)]
+    )
+    while sent_parts() < 3 and process.poll() is None:
+        time.sleep(0.01)
+    process.send_signal(signal.SIGKILL)
+    process.wait()
+    n_sent = sent_parts()
+    assert 3 <= n_sent < 20, f"{n_sent} parts sent before the upload was killed"
+
+    with _PartCountingEngine.from_rclone_env(
+        bucket, "TEST", part_size=5 * MiB, max_concurrency=4, resume_dir=resume_dir
+    ) as engine:
+        receipt = engine.upload_file(local_path, remote_path)
+        assert engine.parts_sent == 20 - n_sent, engine.parts_sent
+
+    body = client.get_object(Bucket=bucket, Key=remote_path)["Body"].read()
+    assert hashlib.sha256(body).hexdigest() == receipt["sha256sum"]
+    assert body == local_path.read_bytes()
+    # the finished upload's state is removed
+    assert not list(resume_dir.glob("*.jsonl"))
+    print(f"Resumed an upload after {n_sent} of 20 parts")
+
+
+def check_deduplicate(client, bucket, tmpdir):
+    original = Path(tmpdir, "dedup", "original.bin")
+    original.parent.mkdir()
+    original.write_bytes(os.urandom(6 * MiB))
+    duplicate = Path(tmpdir, "dedup", "duplicate.bin")
+    duplicate.write_bytes(original.read_bytes())
+    ledger = UploadLedger(Path(tmpdir, "dedup", "upload_ledger.json"))
+
+    with _PartCountingEngine.from_rclone_env(
+        bucket, "TEST", part_size=5 * MiB
+    ) as engine:
+        receipt = engine.upload_file(original, "dedup/original.bin", ledger=ledger)
+        parts_sent = engine.parts_sent
+        copy_receipt = engine.upload_file(
+            duplicate, "dedup/duplicate.bin", ledger=ledger, deduplicate=True
+        )
+        # copied in the bucket, without sending any parts
+        assert engine.parts_sent == parts_sent
+    assert copy_receipt["sha256sum"] == receipt["sha256sum"]
+    body = client.get_object(Bucket=bucket, Key="dedup/duplicate.bin")["Body"].read()
+    assert body == duplicate.read_bytes()
+    print("Copied a duplicate file instead of uploading it")
+
+
+def check_inventory(engine, client, bucket):
+    keys = [
+        f"inventory/{stage}/{directory}/{i}.txt"
+        for stage in ("a", "b")
+        for directory in ("x", "y/z")
+        for i in range(5)
+    ] + ["inventory/top.txt"]
+    for key in keys:
+        client.put_object(Bucket=bucket, Key=key, Body=key.encode())
+
+    def plain_listing(prefix):
+        paginator = client.get_paginator("list_objects_v2")
+        return {
+            x["Key"]: x["Size"]
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+            for x in page.get("Contents", [])
+        }
+
+    # listed concurrently by sub-prefix, with the same result
+    inventory = engine.list_objects("inventory/")
+    assert {k: inventory.get(k)["size"] for k in keys} == plain_listing("inventory/")
+    assert inventory.is_listed("inventory/new.txt")
+    assert "inventory/new.txt" not in inventory
+
+    # uploads are added with the checksum the store returned
+    engine.upload_bytes(b"new", "inventory/new.txt")
+    assert inventory.get("inventory/new.txt")["size"] == 3
+
+    # a new listing drops deleted objects
+    client.delete_object(Bucket=bucket, Key="inventory/top.txt")
+    engine.list_objects("inventory/")
+    assert "inventory/top.txt" not in inventory
+    assert "inventory/a/x/0.txt" in inventory
+    print(f"Listed {len(plain_listing('inventory/'))} objects into the inventory")
+
+
+def check_zstd(engine, client, bucket, tmpdir):
+    settings = {"codec": "zstd", "level": 3, "block_size": MiB}
+    local_path = Path(tmpdir, "zstd", "reads.fa")
+    local_path.parent.mkdir()
+    # several blocks, so the object is several zstd frames
+    local_path.write_bytes(b">read\n" + os.urandom(3 * MiB).hex().encode())
+    engine.upload_file(local_path, "zstd/reads.fa.zst", True, compression=settings)
+    receipts = engine.upload_shard(
+        [(local_path, "zstd/member.fa.zst", True)],
+        "zstd/shard.tar",
+        compression={"zstd/member.fa.zst": settings},
+    )
+
+    member = receipts[2]
+    start, size = member["member_offset"], member["member_size"]
+    for body in (
+        client.get_object(Bucket=bucket, Key="zstd/reads.fa.zst")["Body"].read(),
+        client.get_object(
+            Bucket=bucket, Key="zstd/shard.tar", Range=f"bytes={start}-{start + size - 1}"
+        )["Body"].read(),
+    ):
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            body, read_across_frames=True
+        )
+        assert reader.read() == local_path.read_bytes()
+    print("Compressed a file and a shard member with zstd")
+
+
+def check_fan_out(client, bucket, tmpdir):
+    replica = f"{bucket}-replica"
+    client.create_bucket(Bucket=replica)
+    local_path = Path(tmpdir, "fan_out", "reads.fa")
+    local_path.parent.mkdir()
+    local_path.write_bytes(b">read\n" + os.urandom(6 * MiB).hex().encode())
+    ledgers = [
+        UploadLedger(Path(tmpdir, "fan_out", f"upload_ledger.{x}.json"))
+        for x in (bucket, replica)
+    ]
+
+    with FanOutEngine.from_rclone_env(
+        [("TEST", bucket), ("TEST", replica)], part_size=5 * MiB
+    ) as fan_out:
+        receipts = fan_out.upload_file(local_path, "fan_out/reads.fa", ledgers=ledgers)
+        receipts += fan_out.upload_file(
+            local_path, "fan_out/reads.fa.gz", True, ledgers=ledgers
+        )
+        shard_receipts = fan_out.upload_shard(
+            [(local_path, "fan_out/member.fa", False)], "fan_out/shard.tar"
+        )
+    for x, receipt in zip([bucket, replica] * 2, receipts):
+        body = client.get_object(Bucket=x, Key=receipt["location_path"])["Body"].read()
+        if receipt["location_path"].endswith(".gz"):
+            body = gzip.decompress(body)
+        assert body == local_path.read_bytes(), receipt
+        assert receipt["location_root"] == x
+    # the last upload of the file is recorded in each destination's ledger
+    for ledger, receipt in zip(ledgers, receipts[2:]):
+        assert ledger.unchanged_receipt(local_path, receipt, True) == receipt
+    assert [[y["location_root"] for y in x] for x in shard_receipts] == [
+        [bucket] * 3,
+        [replica] * 3,
+    ]
+
+    # a destination that fails doesn't stop the others
+    missing = f"{bucket}-missing"
+    with FanOutEngine.from_rclone_env(
+        [("TEST", bucket), ("TEST", missing)], part_size=5 * MiB
+    ) as fan_out:
+        try:
+            fan_out.upload_file(local_path, "fan_out/partial.fa", ledgers=ledgers)
+        except Exception:
+            pass
+        else:
+            raise AssertionError("Upload to a missing bucket succeeded")
+        partial = dict(receipts[0], location_path="fan_out/partial.fa")
+        assert ledgers[0].unchanged_receipt(local_path, partial, False) == partial
+
+        # A retry only sends the file to the destination that failed. The
+        # object is deleted from the other, so sending it again would show.
+        client.delete_object(Bucket=bucket, Key="fan_out/partial.fa")
+        client.create_bucket(Bucket=missing)
+        retried = fan_out.upload_file(local_path, "fan_out/partial.fa", ledgers=ledgers)
+    assert retried[0] == partial
+    assert "Contents" not in client.list_objects_v2(
+        Bucket=bucket, Prefix="fan_out/partial.fa"
+    )
+    body = client.get_object(Bucket=missing, Key="fan_out/partial.fa")["Body"].read()
+    assert body == local_path.read_bytes()
+    print(f"Fanned out {len(receipts)} uploads to {bucket} and {replica}")
+
+
+def main():
+    args = parse_arguments()
+    server = ThreadedMotoServer(port=args.port, verbose=False)
+    server.start()
+    endpoint = f"http://127.0.0.1:{args.port}"
+
+    # The engine reads the same variables as rclone
+    os.environ["RCLONE_CONFIG_TEST_ENDPOINT"] = endpoint
+    os.environ["RCLONE_CONFIG_TEST_ACCESS_KEY_ID"] = "testing"
+    os.environ["RCLONE_CONFIG_TEST_SECRET_ACCESS_KEY"] = "testing"
+
+    try:
+        client = make_s3_client(endpoint, "testing", "testing")
+        client.create_bucket(Bucket=args.bucket)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = write_test_files(tmpdir)
+            with UploadEngine.from_rclone_env(
+                args.bucket, "TEST", part_size=5 * MiB, max_concurrency=4
+            ) as engine:
+                receipts = list(engine.upload_files(files.items(), max_files=3))
+                check_verification(engine, client, args.bucket)
+                check_ledger(engine, client, args.bucket, tmpdir)
+                check_shards(engine, client, args.bucket, files, tmpdir)
+                check_inventory(engine, client, args.bucket)
+                check_zstd(engine, client, args.bucket, tmpdir)
+            check_fan_out(client, args.bucket, tmpdir)
+
+            for (local_path, remote_path), receipt in zip(files.items(), receipts):
+                expected_sha256 = hashlib.sha256(local_path.read_bytes()).hexdigest()
+                body = client.get_object(Bucket=args.bucket, Key=remote_path)[
+                    "Body"
+                ].read()
+                assert hashlib.sha256(body).hexdigest() == expected_sha256, remote_path
+                # uploaded with a SHA-256 that the store keeps
+                assert client.head_object(
+                    Bucket=args.bucket, Key=remote_path, ChecksumMode="ENABLED"
+                )["ChecksumSHA256"]
+                assert receipt == {
+                    "storage_type": "s3",
+                    "endpoint": endpoint,
+                    "location_root": args.bucket,
+                    "location_path": remote_path,
+                    "sha256sum": expected_sha256,
+                }, receipt
+                # same format as result-file-uploader's onsuccess block
+                assert receipt_line(receipt) == (
+                    "{"
+                    '"storage_type": "s3", '
+                    f'"endpoint": "{endpoint}", '
+                    f'"location_root": "{args.bucket}", '
+                    f'"location_path": "{remote_path}", '
+                    f'"sha256sum": "{expected_sha256}"'
+                    "}"
+                )
+                print(json.dumps(receipt))
+            check_receipt_store(receipts, tmpdir)
+            check_resume(client, args.bucket, tmpdir)
+            check_deduplicate(client, args.bucket, tmpdir)
+
+        # no multipart uploads left behind
+        assert not client.list_multipart_uploads(Bucket=args.bucket).get("Uploads")
+        print(f"Uploaded and verified {len(files)} files")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
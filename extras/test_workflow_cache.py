@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# Test deploy-pipeline's workflow cache against a local bare git repository
+# standing in for GitHub, without network access.
+#
+# Creates a bare genome-launcher-workflow repository with three tags, the
+# first two with the same content. Deploys the first tag, which clones it
+# into the cache. Then moves the repository away and deploys the tag again
+# with --offline, from the cache only, and checks that both runs deployed
+# the same files. Then checks that an uncached tag fails offline, that two
+# tags with the same content share one cached tree, and that a branch is
+# rejected instead of being cached.
+#
+# usage:
+#   python3 extras/test_workflow_cache.py
+
+from deploy_pipeline.workflow_cache import WorkflowCache
+from pathlib import Path
+import filecmp
+import json
+import subprocess
+import tempfile
+import time
+
+MANIFEST = Path(__file__).parent.parent / "test-data" / "dummy_pb.json"
+
+# The remote path contains "github", so snakedeploy declares the module the
+# same way as for the real repository
+REPO_PATH = Path("github.com", "AToL-Bioinformatics", "genome-launcher-workflow")
+
+WORKFLOW_FILES = {
+    "workflow/Snakefile": 'rule all:\n    input: "done"\n',
+    "config/config.yaml": "manifest: config/manifest.json\n",
+    "config/README.md": "# {{ dataset_id }}\n\nDeployed from the workflow cache.\n",
+    "LICENSE": "MIT\n",
+}
+
+
+def git(*args, cwd):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def make_remote(tmpdir):
+    """
+    A bare repository with tags 0.1.0 and 0.1.1 (same content) and 0.2.0, and
+    a branch, develop.
+    """
+    work = Path(tmpdir, "work")
+    for path, text in WORKFLOW_FILES.items():
+        Path(work, path).parent.mkdir(parents=True, exist_ok=True)
+        Path(work, path).write_text(text)
+    git("init", "--quiet", cwd=work)
+    git("add", ".", cwd=work)
+    for tag in ("0.1.0", "0.1.1", "0.2.0"):
+        if tag == "0.2.0":
+            Path(work, "workflow", "Snakefile").write_text(
+                'rule all:\n    input: "v2"\n'
+            )
+            git("add", ".", cwd=work)
+        git(
+            "-c",
+            "user.name=test",
+            "-c",
+            "user.email=test@example.com",
+            "commit",
+            "--quiet",
+            "--allow-empty",
+            "-m",
+            tag,
+            cwd=work,
+        )
+        git("tag", tag, cwd=work)
+    git("branch", "develop", cwd=work)
+
+    remote = Path(tmpdir, "remote", REPO_PATH)
+    remote.parent.mkdir(parents=True)
+    git("clone", "--quiet", "--bare", str(work), str(remote), cwd=tmpdir)
+    return remote
+
+
+def deploy_pipeline(remote_url, tag, run_dir, cache_dir, *args):
+    start = time.perf_counter()
+    process = subprocess.run(
+        [
+            "deploy-pipeline",
+            "--workflow_url",
+            remote_url,
+            "--workflow_tag",
+            tag,
+            "--workflow_cache",
+            str(cache_dir),
+            "--run-dir",
+            str(run_dir),
+            *args,
+            str(MANIFEST.resolve()),
+        ],
+        capture_output=True,
+        text=True,
+    )
+    return process, time.perf_counter() - start
+
+
+def deployed_files(run_dir):
+    return sorted(
+        str(x.relative_to(run_dir)) for x in run_dir.rglob("*") if x.is_file()
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        remote = make_remote(tmpdir)
+        remote_url = f"file://{remote}"
+        cache_dir = Path(tmpdir, "cache")
+
+        online_dir = Path(tmpdir, "run_online")
+        process, seconds = deploy_pipeline(remote_url, "0.1.0", online_dir, cache_dir)
+        assert process.returncode == 0, process.stderr
+        print(f"Deployed 0.1.0 from the remote in {seconds:.2f} s")
+
+        # the remote is unreachable from here on
+        remote.rename(Path(tmpdir, "unreachable"))
+        offline_dir = Path(tmpdir, "run_offline")
+        process, seconds = deploy_pipeline(
+            remote_url, "0.1.0", offline_dir, cache_dir, "--offline"
+        )
+        assert process.returncode == 0, process.stderr
+        files = deployed_files(online_dir)
+        assert files == deployed_files(offline_dir), files
+        for x in files:
+            assert filecmp.cmp(Path(online_dir, x), Path(offline_dir, x), False), x
+        assert Path(offline_dir, "README.md").read_text().startswith("# ")
+        module = Path(offline_dir, "workflow", "Snakefile").read_text()
+        assert 'tag="0.1.0"' in module, module
+        print(f"Deployed 0.1.0 offline from the cache in {seconds:.2f} s")
+
+        process, _ = deploy_pipeline(
+            remote_url, "0.2.0", Path(tmpdir, "run_missing"), cache_dir, "--offline"
+        )
+        assert process.returncode != 0
+        assert "isn't in the workflow cache" in process.stderr, process.stderr
+        print("Refused to deploy an uncached tag offline")
+
+        # tags with the same content share a tree
+        Path(tmpdir, "unreachable").rename(remote)
+        cache = WorkflowCache(cache_dir)
+        assert cache.source(remote_url, "0.1.1") == cache.get(remote_url, "0.1.0")
+        assert cache.source(remote_url, "0.2.0") != cache.get(remote_url, "0.1.0")
+        refs = json.loads(Path(cache_dir, "refs.json").read_text())
+        trees = list(Path(cache_dir, "trees").iterdir())
+        assert len(refs) == 3 and len(trees) == 2, (refs, trees)
+        print(f"Cached {len(refs)} tags in {len(trees)} trees")
+
+        process, _ = deploy_pipeline(
+            remote_url, "develop", Path(tmpdir, "run_branch"), cache_dir
+        )
+        assert process.returncode != 0
+        assert "isn't a tag" in process.stderr, process.stderr
+        assert cache.get(remote_url, "develop") is None
+        print("Refused to deploy a branch")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
+from argparse import SUPPRESS
 from pathlib import Path
+from bpa_metadata import CkanMetadataCache
+from snakemake.logging import logger
 from snakemake_setup import get_snakefile, run_workflow
 from common import generate_parser, log_version
+from yaml_manifest import Manifest
+import requests
+import shutil
 
 
 def parse_arguments():
@@ -12,22 +18,101 @@ def parse_arguments():
     settings_parser.add_argument(
         "--parallel_downloads", type=int, help="Number of parallel downloads", default=1
     )
+    settings_parser.add_argument(
+        "--no_prefetch",
+        action="store_true",
+        help="Don't look up file sizes on the Data Portal before downloading",
+    )
+    settings_parser.add_argument(
+        "--metadata_ttl",
+        type=float,
+        help="Hours to keep cached Data Portal metadata",
+        default=24,
+    )
+    outputs_parser.add_argument(
+        "--metadata_cache",
+        type=Path,
+        help="Cache file for Data Portal metadata (default: resources/ckan_metadata.json)",
+    )
     parser.add_argument("manifest_file", type=Path, help="Path to the manifest")
 
+    # CKAN instance to query for metadata. Override for testing.
+    inputs_parser.add_argument(
+        "--ckan_url", help=SUPPRESS, default="https://data.bioplatforms.com"
+    )
+
     return parser.parse_args()
 
 
+def prefetch_metadata(args, manifest) -> dict[str, dict]:
+    """
+    Look up size and md5 for every file in the manifest, keyed by raw_path.
+    Returns an empty dict if the Data Portal can't be reached or doesn't
+    list every file, so the downloads fall back to the default disk_mb.
+    """
+    cache_file = args.metadata_cache or Path(
+        manifest.get_dir("resources"), "ckan_metadata.json"
+    )
+    metadata_cache = CkanMetadataCache(
+        cache_file, ttl=args.metadata_ttl * 3600, ckan_url=args.ckan_url
+    )
+    try:
+        return metadata_cache.manifest_metadata(manifest)
+    except (requests.RequestException, KeyError, ValueError) as e:
+        logger.warning(
+            f"Couldn't look up the files on the Data Portal, continuing without "
+            f"their sizes: {e}"
+        )
+        return {}
+
+
+def check_free_space(manifest, resource_metadata) -> int:
+    """
+    Check there's room for the files that haven't been downloaded yet, and
+    return the free space in MB. Files without a known size aren't counted.
+    """
+    missing = [
+        v for k, v in resource_metadata.items() if not Path(k).exists() and v["size"]
+    ]
+    download_bytes = sum(int(x["size"]) for x in missing)
+    download_dir = manifest.get_dir("downloads")
+    existing_dir = next(x for x in [download_dir, *download_dir.parents] if x.exists())
+    free_bytes = shutil.disk_usage(existing_dir).free
+    logger.warning(
+        f"{len(missing)} files to download, {download_bytes / 1e9:.1f} GB. "
+        f"{free_bytes / 1e9:.1f} GB free in {download_dir}."
+    )
+    if download_bytes > free_bytes:
+        raise OSError(f"Not enough space in {download_dir} for the downloads.")
+
+    return free_bytes // 1_000_000
+
+
 def main():
 
     log_version()
     args = parse_arguments()
     snakefile = get_snakefile(__package__)
 
+    config = vars(args)
+    resources = {}
+    # dry runs don't download anything, so they don't need the sizes
+    if not (args.no_prefetch or args.dry_run):
+        with open(args.manifest_file, "rb") as f:
+            manifest = Manifest.model_validate_json(f.read())
+        config["resource_metadata"] = prefetch_metadata(args, manifest)
+        if config["resource_metadata"]:
+            # the downloads running at once can't need more than is free
+            resources["disk_mb"] = check_free_space(
+                manifest, config["resource_metadata"]
+            )
+
     run_workflow(
         snakefile=snakefile,
-        config=vars(args),
+        config=config,
         cores=args.parallel_downloads,
         dry_run=args.dry_run,
+        resources=resources,
     )
 
 
@@ -0,0 +1,223 @@
+"""
+Parallel block gzip compression.
+
+The input is split into blocks that are compressed independently in a thread
+pool (zlib releases the GIL) and written as consecutive gzip members. The
+result is a standard multi-member gzip file that gzip, pigz, zcat and
+Python's gzip module can all read.
+
+With `bgzf`, the members are BGZF blocks, as written by bgzip, and
+`compress_file` can also write the .gzi index, so the output can be read at
+random by samtools faidx and other htslib tools.
+
+With `codec="zstd"`, the blocks are written as consecutive zstd frames
+instead, which zstd, zstdcat and the zstandard module all read as one stream.
+zstd needs the zstandard module.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import os
+import struct
+import tempfile
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MiB = 1024**2
+
+DEFAULT_BLOCK_SIZE = 1 * MiB
+DEFAULT_CODEC = "gzip"
+DEFAULT_LEVEL = 6
+
+# the suffix each codec adds to compressed files
+CODEC_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+# htslib's input size per BGZF block, so a compressed block always fits in
+# 64 KiB
+BGZF_BLOCK_SIZE = 0xFF00
+
+# the empty block that ends every BGZF file
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+
+def _gzip_member(block: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(block) + compressor.flush()
+
+
+def _zstd_frame(block: bytes, level: int) -> bytes:
+    # zstandard releases the GIL too. Compressors aren't thread safe, so each
+    # block gets its own.
+    return zstandard.ZstdCompressor(level=level, write_content_size=True).compress(
+        block
+    )
+
+
+def _check_codec(codec: str, bgzf: bool = False):
+    if codec not in CODEC_SUFFIXES:
+        raise ValueError(
+            f"Unknown compression codec {codec}. "
+            f"Choose from {', '.join(CODEC_SUFFIXES)}"
+        )
+    if bgzf and codec != "gzip":
+        raise ValueError("bgzf output is only written with the gzip codec")
+    if codec == "zstd" and zstandard is None:
+        raise ImportError(
+            "The zstd codec needs zstandard. "
+            "Install it with `pip install zstandard`."
+        )
+
+
+def _bgzf_block(block: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    deflated = compressor.compress(block) + compressor.flush()
+    # gzip header with a "BC" extra field holding the block size minus one
+    header = struct.pack(
+        "<4BI2BH2BHH",
+        0x1F,
+        0x8B,
+        8,
+        4,
+        0,
+        0,
+        0xFF,
+        6,
+        ord("B"),
+        ord("C"),
+        2,
+        len(deflated) + 25,
+    )
+    trailer = struct.pack("<II", zlib.crc32(block), len(block))
+    return header + deflated + trailer
+
+
+def _compress_members(f_in, level, block_size, executor, threads, bgzf, codec):
+    """Yield (member, uncompressed size) for each block, in order."""
+    _check_codec(codec, bgzf)
+    if codec == "zstd":
+        compress = _zstd_frame
+    else:
+        compress = _bgzf_block if bgzf else _gzip_member
+    if bgzf:
+        block_size = BGZF_BLOCK_SIZE
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(threads, thread_name_prefix="compress")
+
+    pending = deque()
+    n_blocks = 0
+    try:
+        while block := f_in.read(block_size):
+            n_blocks += 1
+            pending.append((executor.submit(compress, block, level), len(block)))
+            if len(pending) >= 2 * threads:
+                future, size = pending.popleft()
+                yield future.result(), size
+        while pending:
+            future, size = pending.popleft()
+            yield future.result(), size
+        if bgzf:
+            yield BGZF_EOF, 0
+        elif n_blocks == 0:
+            # an empty file still needs a gzip header, or a zstd frame
+            yield compress(b"", level), 0
+    finally:
+        for future, _ in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown()
+
+
+def compress_blocks(
+    f_in,
+    level: int = DEFAULT_LEVEL,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    executor: ThreadPoolExecutor | None = None,
+    threads: int = 4,
+    bgzf: bool = False,
+    codec: str = DEFAULT_CODEC,
+):
+    """
+    Read the binary file object `f_in` once and yield its gzip-compressed
+    contents as a series of gzip members, in order, or zstd frames with
+    `codec="zstd"`.
+
+    Blocks are compressed by `executor`, or by a new pool of `threads`
+    threads. At most `2 * threads` blocks are held in memory. With `bgzf`,
+    the members are BGZF blocks of at most 64 KiB, followed by the BGZF EOF
+    marker, and `block_size` is ignored.
+    """
+    for member, _ in _compress_members(
+        f_in, level, block_size, executor, threads, bgzf, codec
+    ):
+        yield member
+
+
+def compress_file(
+    file_path: Path,
+    gz_path: Path,
+    level: int = DEFAULT_LEVEL,
+    threads: int = 4,
+    bgzf: bool = False,
+    index: bool = True,
+    codec: str = DEFAULT_CODEC,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> Path:
+    """
+    Compress file_path to gz_path with `codec`, and return gz_path. With
+    `bgzf` and `index`, also write the .gzi index to gz_path + ".gzi".
+
+    Files are written to a temporary name first, so an interrupted run never
+    leaves a partial file behind.
+    """
+    gz_path = Path(gz_path)
+    # compressed and uncompressed offsets of each block but the first
+    offsets = []
+    compressed_offset = uncompressed_offset = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=gz_path.parent, suffix=".tmp")
+    try:
+        with open(file_path, "rb") as f_in, os.fdopen(fd, "wb") as f_out:
+            for member, size in _compress_members(
+                f_in, level, block_size, None, threads, bgzf, codec
+            ):
+                if compressed_offset and size:
+                    offsets.append((compressed_offset, uncompressed_offset))
+                f_out.write(member)
+                compressed_offset += len(member)
+                uncompressed_offset += size
+        if bgzf and index:
+            write_gzi(offsets, Path(f"{gz_path}.gzi"))
+        os.replace(tmp_path, gz_path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    return gz_path
+
+
+def write_gzi(offsets: list[tuple[int, int]], gzi_path: Path):
+    """
+    Write a .gzi index in htslib's format: the number of entries, then the
+    compressed and uncompressed offset of each BGZF block but the first, all
+    as little-endian 64-bit integers.
+
+    Like compress_file, the index is written to a temporary name first, so an
+    interrupted run never leaves a partial index behind.
+    """
+    gzi_path = Path(gzi_path)
+    fd, tmp_path = tempfile.mkstemp(dir=gzi_path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(struct.pack("<Q", len(offsets)))
+            for x in offsets:
+                f.write(struct.pack("<QQ", *x))
+        os.replace(tmp_path, gzi_path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
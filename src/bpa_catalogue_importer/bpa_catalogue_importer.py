@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+from bpa_metadata import import_catalogue, store_is_current
+from common import generate_parser, log_version
+from pathlib import Path
+from snakemake.logging import logger
+
+
+def parse_arguments():
+    parser, inputs_parser, outputs_parser, settings_parser = generate_parser()
+
+    inputs_parser.add_argument(
+        "--packages", type=Path, required=True, help="Mapped Packages CSV"
+    )
+    inputs_parser.add_argument(
+        "--resources", type=Path, required=True, help="Mapped Resources CSV"
+    )
+    settings_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Import even if the store is newer than the CSVs",
+    )
+    parser.add_argument("store", type=Path, help="Path to the catalogue store")
+
+    return parser.parse_args()
+
+
+def main():
+
+    log_version()
+    args = parse_arguments()
+
+    if not args.force and store_is_current(args.store, args.packages, args.resources):
+        logger.warning(f"{args.store} is up to date")
+        return
+
+    if args.dry_run:
+        logger.warning(f"Would import the catalogue to {args.store}")
+        return
+
+    import_catalogue(args.packages, args.resources, args.store)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+from bpa_metadata.catalogue_csv import (
+    read_catalogue_csv,
+    read_packages,
+    read_rnaseq_resources,
+)
+from bpa_metadata.catalogue_store import (
+    import_catalogue,
+    organism_rnaseq_resources,
+    store_is_current,
+)
+from bpa_metadata.ckan_metadata import CkanMetadataCache
+
+__all__ = [
+    "CkanMetadataCache",
+    "import_catalogue",
+    "organism_rnaseq_resources",
+    "read_catalogue_csv",
+    "read_packages",
+    "read_rnaseq_resources",
+    "store_is_current",
+]
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+"""
+Memory-lean loading of the Data Mapper's mapped packages and mapped resources
+CSVs. Only the columns and rows that are needed are kept, and low-cardinality
+keys are stored as categoricals.
+"""
+
+from bpa_metadata.catalogue_store import ORGANISM_KEY, PACKAGE_ID
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+LIBRARY_STRATEGY = "experiment.library_strategy"
+SAMPLE_ID = "sample.bpa_sample_id"
+
+# The only package columns that rnaseq-manifest-generator uses
+PACKAGE_COLUMNS = [ORGANISM_KEY, PACKAGE_ID, LIBRARY_STRATEGY, SAMPLE_ID]
+
+# Keys with a handful of distinct values, stored as categoricals
+_CATEGORY_COLUMNS = [ORGANISM_KEY, LIBRARY_STRATEGY, "file_format", "read_number"]
+
+ENGINES = ["c", "pyarrow"]
+
+
+def _read_chunks_c(csv_path, usecols, chunksize):
+    import pandas as pd
+
+    # Read everything as strings, like the catalogue store, so values are
+    # written back out exactly as they were in the CSV.
+    yield from pd.read_csv(
+        csv_path, header=0, dtype=str, usecols=usecols, chunksize=chunksize
+    )
+
+
+def _read_chunks_pyarrow(csv_path, usecols, chunksize):
+    import pandas as pd
+
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+    except ImportError as e:
+        raise ImportError(
+            "The pyarrow engine needs pyarrow. "
+            "Install it with `pip install atol-genome-launcher[arrow]`."
+        ) from e
+
+    header = pd.read_csv(csv_path, nrows=0).columns
+    if usecols is not None:
+        missing = set(usecols) - set(header)
+        if missing:
+            raise ValueError(f"Columns {sorted(missing)} not found in {csv_path}")
+        header = [x for x in header if x in usecols]
+
+    # pyarrow reads in blocks of bytes rather than rows. Assume about 200
+    # bytes per row, which is close for the Data Mapper exports.
+    block_size = max(chunksize * 200, 1 << 20)
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={x: pa.string() for x in header},
+            include_columns=list(header),
+            strings_can_be_null=True,
+        ),
+    )
+
+    # Convert each record batch separately, so only one batch of Python
+    # strings is held at a time.
+    for batch in reader:
+        yield batch.to_pandas()
+
+
+def read_catalogue_csv(
+    csv_path: Path,
+    usecols: list[str] | None = None,
+    row_filter=None,
+    engine: str = "c",
+    chunksize: int = 10_000,
+):
+    """
+    Read a catalogue CSV in chunks, keeping only `usecols` and the rows where
+    `row_filter(chunk)` is True. Values are read as strings, and the keys in
+    _CATEGORY_COLUMNS are converted to categoricals.
+    """
+    import pandas as pd
+
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {ENGINES}, not {engine}")
+    read_chunks = _read_chunks_pyarrow if engine == "pyarrow" else _read_chunks_c
+
+    kept = []
+    n_rows = 0
+    for chunk in read_chunks(csv_path, usecols, chunksize):
+        n_rows += len(chunk)
+        kept.append(chunk[row_filter(chunk)] if row_filter else chunk)
+
+    if kept:
+        catalogue_df = pd.concat(kept, ignore_index=True)
+    else:
+        # e.g. a header with no rows, which pyarrow reads as no batches
+        catalogue_df = pd.read_csv(
+            csv_path, header=0, dtype=str, usecols=usecols, nrows=0
+        )
+    logger.info(f"Kept {len(catalogue_df)} of {n_rows} rows from {csv_path}")
+
+    for column in _CATEGORY_COLUMNS:
+        if column in catalogue_df.columns:
+            catalogue_df[column] = catalogue_df[column].astype("category")
+
+    return catalogue_df
+
+
+def read_packages(packages_csv: Path, engine: str = "c"):
+    """The mapped packages, with only the columns in PACKAGE_COLUMNS."""
+    return read_catalogue_csv(packages_csv, usecols=PACKAGE_COLUMNS, engine=engine)
+
+
+def read_rnaseq_resources(resources_csv: Path, package_ids, engine: str = "c"):
+    """
+    The fastq resources with a read number from the packages in
+    `package_ids`, with all of their columns.
+    """
+    package_ids = set(package_ids)
+
+    def is_rnaseq_read(chunk):
+        return (
+            chunk[PACKAGE_ID].isin(package_ids)
+            & (chunk["file_format"] == "fastq")
+            & chunk["read_number"].notna()
+        )
+
+    return read_catalogue_csv(resources_csv, row_filter=is_rnaseq_read, engine=engine)
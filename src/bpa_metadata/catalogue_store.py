@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+An indexed SQLite copy of the Data Mapper's mapped packages and mapped
+resources CSVs, so one organism can be looked up without parsing the whole
+catalogue.
+"""
+
+from pathlib import Path
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+ORGANISM_KEY = "organism.organism_grouping_key"
+PACKAGE_ID = "experiment.bpa_package_id"
+
+_PACKAGES_TABLE = "packages"
+_RESOURCES_TABLE = "resources"
+
+
+def _import_csv(connection, csv_path: Path, table: str, chunksize: int):
+    # pandas is only needed for the import, so querying the store stays fast.
+    import pandas as pd
+
+    # Read everything as strings, so the store doesn't depend on the types
+    # inferred from whichever chunk came first, and values are written back
+    # out exactly as they were in the CSV.
+    for i, chunk in enumerate(
+        pd.read_csv(csv_path, header=0, dtype=str, chunksize=chunksize)
+    ):
+        chunk.to_sql(table, connection, if_exists="replace" if i == 0 else "append")
+
+
+def import_catalogue(
+    packages_csv: Path, resources_csv: Path, store: Path, chunksize: int = 100_000
+) -> Path:
+    """
+    Convert the mapped packages and mapped resources CSVs into an SQLite
+    store with indexes on the organism_grouping_key and bpa_package_id.
+    """
+    store = Path(store)
+    store.parent.mkdir(parents=True, exist_ok=True)
+    tmp_store = store.with_name(f"{store.name}.tmp")
+    tmp_store.unlink(missing_ok=True)
+
+    logger.warning(f"Importing {packages_csv} and {resources_csv} to {store}")
+    with sqlite3.connect(tmp_store) as connection:
+        _import_csv(connection, packages_csv, _PACKAGES_TABLE, chunksize)
+        _import_csv(connection, resources_csv, _RESOURCES_TABLE, chunksize)
+        connection.execute(
+            f'CREATE INDEX packages_organism ON {_PACKAGES_TABLE} ("{ORGANISM_KEY}")'
+        )
+        connection.execute(
+            f'CREATE INDEX packages_package_id ON {_PACKAGES_TABLE} ("{PACKAGE_ID}")'
+        )
+        connection.execute(
+            f'CREATE INDEX resources_package_id ON {_RESOURCES_TABLE} ("{PACKAGE_ID}")'
+        )
+    connection.close()
+
+    # replace the old store in one step
+    os.replace(tmp_store, store)
+    return store
+
+
+def store_is_current(store: Path, *csv_paths: Path) -> bool:
+    """True if the store exists and is newer than all the CSVs."""
+    store = Path(store)
+    if not store.is_file():
+        return False
+    store_mtime = store.stat().st_mtime
+    return all(Path(x).stat().st_mtime <= store_mtime for x in csv_paths)
+
+
+def organism_rnaseq_resources(
+    store: Path, organism_grouping_key: str
+) -> tuple[list[str], list[tuple]]:
+    """
+    The RNA-Seq fastq resources with a read number for an organism, with the
+    `sample.bpa_sample_id` of their package. Returns the column names and the
+    rows, in the same order as rnaseq-manifest-generator's CSV path.
+    """
+    query = f"""
+        WITH query_packages AS (
+            SELECT "index" AS package_order, "{PACKAGE_ID}" AS package_id
+            FROM {_PACKAGES_TABLE}
+            WHERE "{ORGANISM_KEY}" = ?
+            AND "experiment.library_strategy" = 'RNA-Seq'
+        )
+        SELECT r.*, p."sample.bpa_sample_id"
+        FROM query_packages q
+        JOIN {_RESOURCES_TABLE} r ON r."{PACKAGE_ID}" = q.package_id
+        LEFT JOIN {_PACKAGES_TABLE} p ON p."{PACKAGE_ID}" = r."{PACKAGE_ID}"
+        WHERE r.file_format = 'fastq' AND r.read_number IS NOT NULL
+        ORDER BY q.package_order, r."index", p."index"
+    """
+    with sqlite3.connect(f"file:{store}?mode=ro", uri=True) as connection:
+        cursor = connection.execute(query, [organism_grouping_key])
+        columns = [x[0] for x in cursor.description]
+        rows = cursor.fetchall()
+    connection.close()
+
+    # Drop sqlite's "index" column, and put the package ID first like
+    # DataFrame.reset_index() does.
+    keep = [i for i, x in enumerate(columns) if x not in ("index", PACKAGE_ID)]
+    order = [columns.index(PACKAGE_ID), *keep]
+    return [columns[i] for i in order], [tuple(row[i] for i in order) for row in rows]
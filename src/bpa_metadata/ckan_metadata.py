@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+"""Batched CKAN resource metadata lookups with an on-disk cache."""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import json
+import logging
+import os
+import requests
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_CKAN_URL = "https://data.bioplatforms.com"
+_PACKAGE_SHOW = "api/3/action/package_show"
+
+# Resource fields we keep from package_show
+_RESOURCE_FIELDS = ["id", "name", "url", "size", "md5", "last_modified"]
+
+
+class CkanMetadataCache:
+    """
+    Resource metadata for CKAN packages, fetched with one package_show request
+    per package and cached on disk for `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        cache_file: Path,
+        ttl: float = 86400,
+        ckan_url: str = _DEFAULT_CKAN_URL,
+        apikey: str | None = None,
+        max_workers: int = 8,
+        timeout: float = 30,
+    ):
+        self.cache_file = Path(cache_file)
+        self.ttl = ttl
+        self.ckan_url = ckan_url.rstrip("/")
+        self.apikey = apikey if apikey is not None else os.environ.get("BPA_APIKEY")
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._packages = self._read_cache()
+
+    def _read_cache(self) -> dict[str, dict]:
+        if not self.cache_file.is_file():
+            return {}
+        try:
+            with open(self.cache_file, "rt") as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            logger.warning(f"Ignoring unreadable metadata cache {self.cache_file}")
+            return {}
+
+    def _write_cache(self):
+        # Write to a temporary file and rename, so concurrent readers never see
+        # a partial cache.
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_file.parent, suffix=".tmp")
+        with os.fdopen(fd, "wt") as f:
+            json.dump(self._packages, f)
+        os.replace(tmp_path, self.cache_file)
+
+    def _is_fresh(self, package_id: str) -> bool:
+        cached = self._packages.get(package_id)
+        return cached is not None and time.time() - cached["fetched"] < self.ttl
+
+    def _fetch_package(self, session: requests.Session, package_id: str) -> dict:
+        response = session.get(
+            f"{self.ckan_url}/{_PACKAGE_SHOW}",
+            params={"id": package_id},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        body = response.json()
+        if not body.get("success"):
+            raise ValueError(f"package_show failed for {package_id}: {body}")
+
+        resources = {}
+        for resource in body["result"].get("resources", []):
+            resources[resource["id"]] = {k: resource.get(k) for k in _RESOURCE_FIELDS}
+
+        return {"fetched": time.time(), "resources": resources}
+
+    def prefetch(self, package_ids) -> None:
+        """Fetch any packages that aren't in the cache or have expired."""
+        stale = sorted(set(x for x in package_ids if not self._is_fresh(x)))
+        if not stale:
+            return
+
+        logger.info(f"Fetching CKAN metadata for {len(stale)} packages")
+        with requests.Session() as session:
+            if self.apikey:
+                session.headers["X-CKAN-API-Key"] = self.apikey
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                fetched = executor.map(
+                    lambda x: self._fetch_package(session, x), stale
+                )
+                for package_id, package in zip(stale, fetched):
+                    self._packages[package_id] = package
+
+        self._write_cache()
+
+    def resource(self, package_id: str, resource_id: str) -> dict:
+        """Cached metadata for a single resource."""
+        try:
+            return self._packages[package_id]["resources"][resource_id]
+        except KeyError:
+            raise KeyError(
+                f"Resource {resource_id} not found in package {package_id}. "
+                "Has it been prefetched?"
+            )
+
+    def manifest_metadata(self, manifest) -> dict[str, dict]:
+        """
+        Resolve the metadata for every BpaFile in a Manifest, keyed by the
+        raw_path. Makes at most one request per package.
+        """
+        bpa_files = manifest.reads.all_bpa_files
+        self.prefetch(x.package_id for x in bpa_files)
+
+        metadata = {}
+        for bpa_file in bpa_files:
+            resource = self.resource(bpa_file.package_id, bpa_file.resource_id)
+            if resource.get("md5") and resource["md5"] != bpa_file.md5sum:
+                logger.warning(
+                    f"md5sum for {bpa_file.url} in the manifest ({bpa_file.md5sum}) "
+                    f"doesn't match the Data Portal ({resource['md5']})"
+                )
+            metadata[str(bpa_file.raw_path)] = resource
+
+        return metadata
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 
-from pipeline_config_generator import render_template, template_dir
+from pipeline_config_generator import render_templates, stage_configs, template_context
 from common import generate_parser, log_version
+from deploy_pipeline.workflow_cache import (
+    WorkflowCache,
+    default_cache_dir,
+    deploy_from_cache,
+)
 from pathlib import Path
-from snakedeploy.deploy import deploy
 from snakemake.logging import logger
 from urllib.parse import urlsplit
 from yaml_manifest import Manifest
@@ -36,7 +40,10 @@ def parse_arguments():
 
     settings_parser.add_argument(
         "--workflow_tag",
-        help="genome-launcher-workflow tag",
+        help=(
+            "genome-launcher-workflow tag. Tags are cached without checking "
+            "the remote again, so branches and commits aren't accepted"
+        ),
         type=str,
         default="0.9.1",
     )
@@ -45,6 +52,19 @@ def parse_arguments():
         "--force", help="Passed to snakedeploy", action="store_true"
     )
 
+    settings_parser.add_argument(
+        "--offline",
+        help="Deploy from the workflow cache only, without network access",
+        action="store_true",
+    )
+
+    inputs_parser.add_argument(
+        "--workflow_cache",
+        help="Cache of workflow sources, by URL and tag",
+        default=default_cache_dir(),
+        type=Path,
+    )
+
     outputs_parser.add_argument(
         "--run-dir",
         help="Run directory for the assembly",
@@ -64,69 +84,32 @@ def main():
         manifest = Manifest.model_validate_json(f.read())
 
     logger.warning(f"Deploying workflow to {args.run_dir}")
-    deploy(
+    deploy_from_cache(
+        WorkflowCache(args.workflow_cache),
         args.workflow_url.geturl(),
-        dest_path=args.run_dir,
         name=args.workflow_url.path.rsplit("/", 1)[1],
         tag=args.workflow_tag,
+        dest_path=args.run_dir,
         force=args.force,
-        branch=None,
+        offline=args.offline,
     )
 
     # replace config with manifest file
     shutil.copy(args.manifest_file, Path(args.run_dir, "config", "manifest.json"))
 
-    # format the readme
+    # Format the readme and the sanger-tol configs in one pass, with one
+    # context for the manifest
+    context = template_context(manifest)
     readme_template = Path(args.run_dir, "config", "README.md")
-    render_template(manifest, readme_template, Path(args.run_dir, "README.md"))
-    readme_template.unlink()
-
-    # TODO: sbatch config for genome launcher workflow
-
-    # format the sanger-tol configs
-    path_to_templates = template_dir()
-    render_template(
+    render_templates(
         manifest,
-        Path(path_to_templates, "sanger-tol_genomeassembly_e651801.data.yaml.j2"),
-        Path(
-            args.run_dir,
-            f"{manifest.pipeline_input("genomeassembly")["genomic_data"]}.sample",
-        ),
-    )
-
-    render_template(
-        manifest,
-        Path(path_to_templates, "sanger-tol_genomeassembly_e651801.spec.yaml.j2"),
-        Path(
-            args.run_dir,
-            f"{manifest.pipeline_input("genomeassembly")["assembly_specs"]}",
-        ),
-    )
-
-    # render ascc template
-    render_template(
-        manifest,
-        Path(path_to_templates, "sanger-tol_ascc_0.5.3.yaml.j2"),
-        Path(args.run_dir, f"{manifest.pipeline_input("ascc")["input"]}.sample"),
-    )
-
-    # render the ascc samplesheet
-    render_template(
-        manifest,
-        Path(path_to_templates, "sanger-tol_ascc_0.5.3.samplesheet.csv.j2"),
-        Path(args.run_dir, f"{manifest.pipeline_input("ascc")["samplesheet"]}.sample"),
+        [(readme_template, Path(args.run_dir, "README.md"))]
+        + stage_configs(manifest, args.run_dir, context),
+        context,
     )
+    readme_template.unlink()
 
-    # if there is Hi-C, render the treeval template
-    if bool(manifest.hic_reads):
-        render_template(
-            manifest,
-            Path(path_to_templates, "sanger-tol_treeval_1.4.5.yaml.j2"),
-            Path(
-                args.run_dir,
-                f"{manifest.pipeline_input("treeval")["input"]}.sample",
-            ),
-        )
+    # TODO: sbatch config for genome launcher workflow
 
 
 if __name__ == "__main__":
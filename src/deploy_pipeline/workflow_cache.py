@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+"""A local, content-addressed cache of workflow sources for snakedeploy."""
+
+from pathlib import Path
+from snakedeploy.deploy import WorkflowDeployer
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def default_cache_dir() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path(Path.home(), ".cache")
+    return Path(cache_home, "atol-genome-launcher", "workflows")
+
+
+class WorkflowCache:
+    """
+    Workflow source trees, fetched once per URL and tag with git.
+
+    Each tree is stored under `trees/`, named by its git tree hash, so tags
+    with the same content share one copy. `refs.json` maps each URL and tag to
+    its tree and commit. Tags are treated as immutable: once a tag is cached,
+    it's used without contacting the remote. Branches and commits would go
+    stale in the cache, so only tags are fetched.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.refs_file = Path(self.cache_dir, "refs.json")
+        self._refs = self._read_refs()
+
+    def _read_refs(self) -> dict[str, dict]:
+        if not self.refs_file.is_file():
+            return {}
+        try:
+            with open(self.refs_file, "rt") as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            logger.warning(f"Ignoring unreadable workflow cache {self.refs_file}")
+            return {}
+
+    def _write_refs(self):
+        # Write to a temporary file and rename, so concurrent deploys never see
+        # a partial index.
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wt") as f:
+            json.dump(self._refs, f, indent=2)
+        os.replace(tmp_path, self.refs_file)
+
+    @staticmethod
+    def _key(url: str, tag: str) -> str:
+        return f"{url}@{tag}"
+
+    def get(self, url: str, tag: str) -> Path | None:
+        """The cached source tree for `url` at `tag`, or None."""
+        ref = self._refs.get(self._key(url, tag))
+        if ref is None:
+            return None
+        tree_dir = Path(self.cache_dir, "trees", ref["tree"])
+        return tree_dir if tree_dir.is_dir() else None
+
+    def fetch(self, url: str, tag: str) -> Path:
+        """
+        Clone `url` at `tag` into the cache, and return its source tree.
+        Raises ValueError if `tag` isn't a tag in the remote.
+        """
+        remote_tags = subprocess.run(
+            ["git", "ls-remote", "--tags", url, f"refs/tags/{tag}"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        if not remote_tags.strip():
+            raise ValueError(
+                f"{tag} isn't a tag in {url}. Only tags can be deployed, because "
+                "the workflow cache never updates a cached ref."
+            )
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        clone_dir = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix="clone."))
+        try:
+            subprocess.run(
+                ["git", "-c", "advice.detachedHead=false", "clone", "--quiet"]
+                + ["--depth", "1", "--branch", tag, url, str(clone_dir)],
+                check=True,
+            )
+
+            def rev_parse(ref):
+                return subprocess.run(
+                    ["git", "rev-parse", ref],
+                    cwd=clone_dir,
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout.strip()
+
+            commit = rev_parse("HEAD")
+            tree = rev_parse("HEAD^{tree}")
+            shutil.rmtree(Path(clone_dir, ".git"))
+
+            tree_dir = Path(self.cache_dir, "trees", tree)
+            tree_dir.parent.mkdir(exist_ok=True)
+            try:
+                clone_dir.rename(tree_dir)
+            except OSError:
+                # the same content is already cached, e.g. under another tag
+                if not tree_dir.is_dir():
+                    raise
+        finally:
+            shutil.rmtree(clone_dir, ignore_errors=True)
+
+        # another deploy may have added refs since this one started
+        self._refs = self._read_refs()
+        self._refs[self._key(url, tag)] = {"tree": tree, "commit": commit}
+        self._write_refs()
+        logger.info(f"Cached {url} at {tag} ({commit})")
+        return tree_dir
+
+    def source(self, url: str, tag: str, offline: bool = False) -> Path:
+        """
+        The source tree for `url` at `tag`, fetched first if it isn't cached.
+        With `offline`, raise FileNotFoundError instead of fetching.
+        """
+        tree_dir = self.get(url, tag)
+        if tree_dir is not None:
+            return tree_dir
+        if offline:
+            raise FileNotFoundError(
+                f"{url} at {tag} isn't in the workflow cache {self.cache_dir}. "
+                "Deploy it once with network access."
+            )
+        return self.fetch(url, tag)
+
+
+class _CachedProvider:
+    """
+    snakedeploy's provider for the workflow URL, with "clone" copying the
+    cached source tree instead. The deployed module still refers to the URL
+    and tag.
+    """
+
+    def __init__(self, provider, tree_dir: Path):
+        self._provider = provider
+        self.tree_dir = tree_dir
+
+    def clone(self, path: str):
+        shutil.copytree(self.tree_dir, path, dirs_exist_ok=True)
+
+    def checkout(self, path: str, ref: str):
+        # the cached tree is already at the tag
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._provider, name)
+
+
+def deploy_from_cache(
+    cache: WorkflowCache,
+    source_url: str,
+    name: str,
+    tag: str,
+    dest_path: Path,
+    force: bool = False,
+    offline: bool = False,
+):
+    """Like snakedeploy.deploy.deploy, with the sources from `cache`."""
+    tree_dir = cache.source(source_url, tag, offline)
+    with WorkflowDeployer(
+        source=source_url, dest=Path(dest_path), tag=tag, force=force
+    ) as deployer:
+        deployer.provider = _CachedProvider(deployer.provider, tree_dir)
+        deployer.deploy(name=name)
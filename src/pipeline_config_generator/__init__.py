@@ -1,6 +1,15 @@
 from pipeline_config_generator.pipeline_config_generator import (
     render_template,
+    render_templates,
+    stage_configs,
+    template_context,
     template_dir,
 )
 
-__all__ = ["render_template", "template_dir"]
+__all__ = [
+    "render_template",
+    "render_templates",
+    "stage_configs",
+    "template_context",
+    "template_dir",
+]
@@ -1,9 +1,34 @@
 #!/usr/bin/env python3
 
 from common import generate_parser
+from functools import lru_cache
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from pathlib import Path
 import importlib.resources as pkg_resources
 from yaml_manifest import Manifest
+from yaml_manifest.layout import get_pipeline_input
+
+# The sanger-tol configs rendered for each assembly, as (template, stage,
+# pipeline_input key, suffix of the output file). Stages that need Hi-C are
+# only rendered if the manifest has it.
+STAGE_TEMPLATES = [
+    (
+        "sanger-tol_genomeassembly_e651801.data.yaml.j2",
+        "genomeassembly",
+        "genomic_data",
+        ".sample",
+    ),
+    (
+        "sanger-tol_genomeassembly_e651801.spec.yaml.j2",
+        "genomeassembly",
+        "assembly_specs",
+        "",
+    ),
+    ("sanger-tol_ascc_0.5.3.yaml.j2", "ascc", "input", ".sample"),
+    ("sanger-tol_ascc_0.5.3.samplesheet.csv.j2", "ascc", "samplesheet", ".sample"),
+    ("sanger-tol_treeval_1.4.5.yaml.j2", "treeval", "input", ".sample"),
+]
+HIC_STAGES = {"treeval"}
 
 
 def parse_arguments():
@@ -26,23 +51,76 @@ def template_dir():
     return pkg_resources.files(__package__).joinpath("templates")
 
 
-def render_template(manifest, template_path, outfile):
+@lru_cache(maxsize=8)
+def _environment(directory: str) -> Environment:
+    """
+    One Jinja2 environment per template directory. It keeps the compiled
+    templates in memory, and their bytecode in the user's temporary
+    directory, so each template is only compiled once across renders and
+    runs.
+
+    Only the most recently used directories keep an environment, so a batch
+    with a template in each run directory doesn't hold them all. The
+    packaged templates are used for every manifest, so they stay cached.
+    """
+    return Environment(
+        loader=FileSystemLoader(directory),
+        bytecode_cache=FileSystemBytecodeCache(),
+    )
+
+
+def get_template(template_path):
+    template_path = Path(template_path).resolve()
+    return _environment(str(template_path.parent)).get_template(template_path.name)
 
+
+def template_context(manifest) -> dict:
+    """
+    The variables for rendering a manifest's templates, computed once per
+    manifest.
+    """
     # ReadFileCollection properties aren't included in model_dump(),
     # so pass them explicitly for templates that need resolved read paths.
-    context = {
+    return {
+        **manifest.model_dump(),
         "pacbio_reads": manifest.pacbio_reads.flat_paths("qc"),
         "ont_reads": manifest.ont_reads.flat_paths("qc"),
         "hic_reads": manifest.hic_reads.flat_paths("qc"),
         "ascc_inputs": manifest.treeval_assembly.outputs.get("genomeassembly", {}),
     }
 
-    # render template
-    rendered = manifest.render_template_file(template_path, **context)
 
-    # ---- write output ----
-    with open(outfile, "wt") as f:
-        f.write(rendered)
+def stage_configs(manifest, run_dir, context=None) -> list[tuple[Path, Path]]:
+    """(template, output path) for each sanger-tol config of this manifest."""
+    context = template_context(manifest) if context is None else context
+    configs = []
+    for template_name, stage, key, suffix in STAGE_TEMPLATES:
+        if stage in HIC_STAGES and not manifest.hic_reads:
+            continue
+        pipeline_input = get_pipeline_input(stage, **context)
+        configs.append(
+            (
+                Path(template_dir(), template_name),
+                Path(run_dir, f"{pipeline_input[key]}{suffix}"),
+            )
+        )
+    return configs
+
+
+def render_templates(manifest, targets, context=None):
+    """
+    Render each (template_path, outfile) in `targets` with one context for
+    the manifest.
+    """
+    context = template_context(manifest) if context is None else context
+    for template_path, outfile in targets:
+        rendered = get_template(template_path).render(context)
+        with open(outfile, "wt") as f:
+            f.write(rendered)
+
+
+def render_template(manifest, template_path, outfile):
+    render_templates(manifest, [(template_path, outfile)])
 
 
 def main():
@@ -1,15 +1,23 @@
 from snakemake_setup import get_snakefile, run_workflow
 from common import generate_parser, log_version
+from pipeline_result_uploader.watch import watch_uploads
 
-from argparse import SUPPRESS
+from argparse import ArgumentTypeError, SUPPRESS
 from pathlib import Path
 
 
+def remote_bucket(value):
+    remote_name, _, bucket = value.partition(":")
+    if not remote_name or not bucket:
+        raise ArgumentTypeError(f"expected REMOTE:BUCKET, got {value!r}")
+    return [remote_name, bucket]
+
+
 def parse_arguments():
     parser, inputs_parser, outputs_parser, settings_parser = generate_parser(
         description=(
             "Collect pipeline result files and upload them to "
-            "S3-compatible object storage using rclone."
+            "S3-compatible object storage."
         ),
     )
 
@@ -28,9 +36,11 @@ def parse_arguments():
     _ = settings_parser.add_argument(
         "--stage",
         type=str,
+        action="append",
         required=True,
         help=(
-            "Pipeline stage to collect results from " "(e.g. 'genomeassembly', 'ascc')."
+            "Pipeline stage to collect results from "
+            "(e.g. 'genomeassembly', 'ascc'). Repeat to upload several stages in one run."
         ),
     )
 
@@ -41,10 +51,118 @@ def parse_arguments():
         help="Name of the S3 bucket.",
     )
 
+    _ = settings_parser.add_argument(
+        "--replicate_to",
+        type=remote_bucket,
+        action="append",
+        metavar="REMOTE:BUCKET",
+        help=(
+            "Also upload every file to this bucket, at the endpoint in the "
+            "RCLONE_CONFIG_{REMOTE}_* variables. Repeat for several."
+        ),
+    )
+
     _ = settings_parser.add_argument(
         "--parallel_downloads", type=int, help="Number of parallel downloads", default=1
     )
 
+    _ = settings_parser.add_argument(
+        "--part_size",
+        type=int,
+        help="Multipart upload part size in MiB. Smaller files are uploaded in one request.",
+        default=64,
+    )
+
+    _ = settings_parser.add_argument(
+        "--max_concurrency",
+        type=int,
+        help="Maximum number of parts in flight across all uploads",
+        default=8,
+    )
+
+    _ = settings_parser.add_argument(
+        "--compress_threads",
+        type=int,
+        help="Threads for compressing files while they are uploaded",
+        default=2,
+    )
+
+    _ = settings_parser.add_argument(
+        "--pack_below",
+        type=int,
+        help=(
+            "Pack files smaller than this many KiB into tar shards, "
+            "instead of uploading them one by one. 0 to upload every file separately."
+        ),
+        default=0,
+    )
+
+    _ = settings_parser.add_argument(
+        "--shard_size",
+        type=int,
+        help="Maximum size of the files in each tar shard, in MiB",
+        default=512,
+    )
+
+    _ = settings_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Upload every file, even if it hasn't changed since the last upload",
+    )
+
+    _ = settings_parser.add_argument(
+        "--no_deduplicate",
+        dest="deduplicate",
+        action="store_false",
+        help=(
+            "Upload every file, instead of copying files with the same content "
+            "as one already in the bucket"
+        ),
+    )
+
+    _ = settings_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "Upload files as they are finished while the pipeline runs, "
+            "then upload the rest once --done_marker appears"
+        ),
+    )
+
+    _ = settings_parser.add_argument(
+        "--done_marker",
+        type=str,
+        help=(
+            "Glob, relative to the stage's output directory, for the file "
+            "the pipeline writes when it finishes"
+        ),
+        default="pipeline_info/execution_report_*.html",
+    )
+
+    _ = settings_parser.add_argument(
+        "--settle_seconds",
+        type=int,
+        help="In watch mode, upload files that haven't changed for this long",
+        default=120,
+    )
+
+    _ = settings_parser.add_argument(
+        "--poll_seconds",
+        type=int,
+        help="In watch mode, how often to look for finished files",
+        default=30,
+    )
+
+    _ = settings_parser.add_argument(
+        "--watch_idle_hours",
+        type=float,
+        help=(
+            "In watch mode, stop watching if no file has been added or changed "
+            "for this long, e.g. if the pipeline was killed, and upload the rest"
+        ),
+        default=24,
+    )
+
     # rclone remote name — env vars must match this
     _ = settings_parser.add_argument(
         "--rclone_remote_name",
@@ -53,7 +171,9 @@ def parse_arguments():
         default="UPLOAD",
     )
 
-    _ = inputs_parser.add_argument("--result_dir", help=SUPPRESS, type=Path)
+    _ = inputs_parser.add_argument(
+        "--result_dir", help=SUPPRESS, type=Path, action="append"
+    )
 
     return parser.parse_args()
 
@@ -63,11 +183,22 @@ def main():
     args = parse_arguments()
     snakefile = get_snakefile(__package__)
 
+    if args.watch and not args.dry_run:
+        # the workflow then uploads whatever the watch didn't
+        watch_uploads(args)
+
     run_workflow(
         snakefile=snakefile,
         config=vars(args),
         cores=args.parallel_downloads,
         dry_run=args.dry_run,
+        # uploads share one S3 client, so run them in this process
+        use_threads=True,
+        # Compressing uploads share the compress pool. Limiting them leaves
+        # the other jobs free to keep the uplink busy.
+        resources={"compress_jobs": args.compress_threads},
+        # receipts are kept in the receipt store
+        keep_metadata=False,
     )
 
 
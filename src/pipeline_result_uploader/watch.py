@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+"""
+Upload stages' result files while the pipeline is still running.
+
+The output directory is polled with the same walk and exclude and compress
+rules as the upload workflow. A file is uploaded once its size and
+modification time have stayed the same for a while. Uploads are recorded in
+the same ledgers and receipt store as the workflow's, so the final sync only
+uploads the files that were missed or changed afterwards.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from s3_upload import FanOutEngine, ReceiptStore, UploadLedger
+from s3_upload.engine import MiB
+from snakemake.logging import logger
+from yaml_manifest.layout import compressed_path, get_stage_compression
+from yaml_manifest.models import Manifest
+import time
+
+
+def _stable_files(seen, candidates, settle_seconds, now):
+    """
+    Update `seen`, {path: (size, mtime_ns, since)}, from the current
+    candidates, {path: stat_result}, and return the paths that haven't
+    changed for settle_seconds.
+    """
+    for path in list(seen):
+        if path not in candidates:
+            del seen[path]
+
+    stable = []
+    for path, stat_result in candidates.items():
+        current = (stat_result.st_size, stat_result.st_mtime_ns)
+        previous = seen.get(path)
+        if previous is None or previous[:2] != current:
+            seen[path] = current + (now,)
+        elif now - previous[2] >= settle_seconds:
+            stable.append(path)
+    return stable
+
+
+def watch_uploads(args):
+    """
+    Upload the stages' files as they are finished, until a file matching
+    `args.done_marker` appears in each stage's output directory, or no file
+    has been added or changed for `args.watch_idle_hours`. The files that
+    aren't uploaded by then are left to the final sync.
+    """
+    with open(Path(args.manifest), "rb") as f:
+        manifest = Manifest.model_validate_json(f.read())
+    if args.result_dir is not None:
+        output_dirs = dict(zip(args.stage, args.result_dir))
+    else:
+        output_dirs = {
+            x: manifest.get_dir("pipeline_output", pipeline=x) for x in args.stage
+        }
+
+    receipts_parent = Path(args.receipts_file).parent
+    destinations = [(args.RCLONE_REMOTE, args.bucket)] + [
+        tuple(x) for x in args.replicate_to or []
+    ]
+    # the same ledgers as the workflow's, one per destination
+    ledgers = [UploadLedger(Path(receipts_parent, "upload_ledger.json"))] + [
+        UploadLedger(Path(receipts_parent, f"upload_ledger.{remote_name}.{x}.json"))
+        for remote_name, x in destinations[1:]
+    ]
+    receipt_store = ReceiptStore(Path(receipts_parent, "receipts.sqlite"))
+    fan_out = FanOutEngine.from_rclone_env(
+        destinations,
+        part_size=args.part_size * MiB,
+        max_concurrency=args.max_concurrency,
+        compress_threads=args.compress_threads,
+        resume_dir=Path(receipts_parent, "multipart_uploads"),
+    )
+
+    logger.warning(
+        f"Watching {', '.join(str(x) for x in output_dirs.values())} for "
+        f"finished files, until {args.done_marker} appears"
+    )
+    seen = {}
+    # files that are in the bucket, with the (size, mtime_ns) they had
+    uploaded = {}
+    n_uploaded = 0
+    last_change = time.monotonic()
+    try:
+        while not all(
+            any(Path(x).glob(args.done_marker)) for x in output_dirs.values()
+        ):
+            # files are uploaded for the first stage they're found in
+            candidates = {}
+            file_stage = {}
+            for stage, output_dir in output_dirs.items():
+                for category, file_path in manifest.iter_upload_files(
+                    stage, output_dir=output_dir
+                ):
+                    # Uploaded files aren't checked again. If they change
+                    # afterwards, the final sync sends them.
+                    if (
+                        category == "exclude"
+                        or file_path in file_stage
+                        or file_path in uploaded
+                    ):
+                        continue
+                    try:
+                        stat_result = file_path.stat()
+                    except FileNotFoundError:
+                        # removed since the walk, e.g. a temporary file
+                        continue
+                    # small files are left to the final sync, which packs them
+                    if stat_result.st_size < args.pack_below * 1024:
+                        continue
+                    candidates[(file_path, category == "compress")] = stat_result
+                    file_stage[file_path] = stage
+
+            now = time.monotonic()
+            if seen.keys() != candidates.keys() or any(
+                seen[x][:2] != (y.st_size, y.st_mtime_ns)
+                for x, y in candidates.items()
+            ):
+                last_change = now
+            elif now - last_change >= args.watch_idle_hours * 3600:
+                # e.g. the pipeline was killed before it wrote the marker
+                logger.warning(
+                    f"No files were added or changed for {args.watch_idle_hours} "
+                    "hours, so the pipeline seems to have stopped"
+                )
+                break
+
+            uploads = []
+            for local_path, compress in _stable_files(
+                seen, candidates, args.settle_seconds, now
+            ):
+                stat_result = candidates[(local_path, compress)]
+                source = (stat_result.st_size, stat_result.st_mtime_ns)
+                stage = file_stage[local_path]
+                settings = (
+                    get_stage_compression(stage, local_path.name) if compress else {}
+                )
+                remote_path = (
+                    str(compressed_path(local_path, settings["codec"]))
+                    if compress
+                    else str(local_path)
+                )
+                # skip files uploaded to every destination by an earlier
+                # watch or run
+                if args.force or not all(
+                    ledger.unchanged_receipt(
+                        local_path, engine.receipt(remote_path, None), compress
+                    )
+                    for engine, ledger in zip(fan_out.engines, ledgers)
+                ):
+                    uploads.append(
+                        (stage, local_path, remote_path, compress, settings)
+                    )
+                uploaded[local_path] = source
+
+            # Each file's receipts are stored as soon as it's uploaded, so a
+            # failed file doesn't lose the others in the same poll.
+            stage_counts = {}
+            with ThreadPoolExecutor(
+                args.parallel_downloads, thread_name_prefix="watch_upload"
+            ) as pool:
+                futures = {
+                    pool.submit(
+                        fan_out.upload_file,
+                        local_path,
+                        remote_path,
+                        compress,
+                        ledgers=ledgers,
+                        compression=settings,
+                        deduplicate=args.deduplicate,
+                    ): (stage, local_path)
+                    for stage, local_path, remote_path, compress, settings in uploads
+                }
+                for future in as_completed(futures):
+                    stage, local_path = futures[future]
+                    try:
+                        receipts = future.result()
+                    except Exception as e:
+                        # tried again at the next poll, and resumed if it was
+                        # a multipart upload
+                        logger.warning(
+                            f"Uploading {local_path} failed, retrying later: {e}"
+                        )
+                        uploaded.pop(local_path, None)
+                        continue
+                    receipt_store.add(
+                        receipts, stage=stage, dataset_id=manifest.dataset_id
+                    )
+                    stage_counts[stage] = stage_counts.get(stage, 0) + 1
+            for stage, n in stage_counts.items():
+                logger.warning(f"Uploaded {n} finished {stage} files")
+                n_uploaded += n
+            if uploads:
+                for ledger in ledgers:
+                    ledger.save()
+
+            time.sleep(args.poll_seconds)
+    finally:
+        for ledger in ledgers:
+            ledger.save()
+        fan_out.close()
+        receipt_store.close()
+
+    logger.warning(f"{n_uploaded} files were uploaded while the pipeline ran")
+    return n_uploaded
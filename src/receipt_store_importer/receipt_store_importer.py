@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+from common import generate_parser, log_version
+from pathlib import Path
+from s3_upload import ReceiptStore
+from snakemake.logging import logger
+
+
+def parse_arguments():
+    parser, inputs_parser, outputs_parser, settings_parser = generate_parser()
+
+    inputs_parser.add_argument(
+        "receipts",
+        type=Path,
+        nargs="+",
+        help="JSONL files of upload receipts, in the current or the old format",
+    )
+    settings_parser.add_argument(
+        "--stage", help="Stage the receipts were uploaded for"
+    )
+    settings_parser.add_argument(
+        "--dataset_id", help="Dataset the receipts were uploaded for"
+    )
+    parser.add_argument("store", type=Path, help="Path to the receipt store")
+
+    return parser.parse_args()
+
+
+def main():
+
+    log_version()
+    args = parse_arguments()
+
+    if args.dry_run:
+        logger.warning(
+            f"Would load {len(args.receipts)} receipt files to {args.store}"
+        )
+        return
+
+    with ReceiptStore(args.store) as store:
+        n_receipts = sum(
+            store.load_jsonl(x, stage=args.stage, dataset_id=args.dataset_id)
+            for x in args.receipts
+        )
+    logger.warning(f"Loaded {n_receipts} receipts to {args.store}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
 #!/usr/bin/env python3
 
+from bpa_metadata import (
+    organism_rnaseq_resources,
+    read_packages,
+    read_rnaseq_resources,
+)
+from bpa_metadata.catalogue_csv import ENGINES
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from importlib import resources
 from importlib.metadata import metadata
 from pathlib import Path
 import argparse
+import csv
 import logging
-import pandas as pd
 
 
 def parse_arguments():
@@ -16,53 +24,100 @@ def parse_arguments():
     parser.add_argument(
         "--resources",
         type=Path,
-        required=True,
         help="Mapped Resources CSV. FIXME. Should be JSON.",
     )
 
     parser.add_argument(
         "--packages",
         type=Path,
-        required=True,
         help="Mapped Packages CSV. FIXME. Should be JSON.",
     )
 
     parser.add_argument(
-        "organism_grouping_key", type=str, help="Data Mapper organism_grouping_key"
+        "--store",
+        type=Path,
+        help=(
+            "Catalogue store created by bpa-catalogue-importer. "
+            "Use instead of --resources and --packages."
+        ),
     )
 
-    parser.add_argument("manifest", type=Path, help="Path to output the manifest")
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="c",
+        help=(
+            "CSV parser for --resources and --packages. "
+            "pyarrow is faster but must be installed."
+        ),
+    )
 
-    return parser.parse_args()
+    parser.add_argument(
+        "--all_organisms",
+        type=Path,
+        metavar="OUTDIR",
+        help=(
+            "Write a manifest for every organism with RNAseq data to OUTDIR, "
+            "instead of a single organism. Requires --resources and --packages."
+        ),
+    )
 
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Number of processes for writing manifests with --all_organisms",
+    )
 
-def main():
-    # print version info
-    pkg_metadata = metadata("atol-genome-launcher")
-    pkg_name = pkg_metadata.get("Name")
-    pkg_version = pkg_metadata.get("Version")
+    parser.add_argument(
+        "organism_grouping_key",
+        type=str,
+        nargs="?",
+        help="Data Mapper organism_grouping_key",
+    )
 
-    logger = logging.getLogger(pkg_name)
-    logger.warning(f"{pkg_name} version {pkg_version}")
+    parser.add_argument(
+        "manifest", type=Path, nargs="?", help="Path to output the manifest"
+    )
 
-    args = parse_arguments()
+    args = parser.parse_args()
 
-    packages_df = pd.read_csv(
-        args.packages, header=0, index_col="organism.organism_grouping_key"
-    )
+    if args.all_organisms:
+        if args.store or not (args.resources and args.packages):
+            parser.error("--all_organisms requires --resources and --packages.")
+        if args.organism_grouping_key or args.manifest:
+            parser.error(
+                "Don't pass organism_grouping_key or manifest with --all_organisms."
+            )
+        return args
+
+    if not (args.organism_grouping_key and args.manifest):
+        parser.error("organism_grouping_key and manifest are required.")
+
+    if not args.store and not (args.resources and args.packages):
+        parser.error("Provide either --store, or --resources and --packages.")
+
+    return args
 
-    resources_df = pd.read_csv(
-        args.resources, header=0, index_col="experiment.bpa_package_id"
-    )
+
+def manifest_from_frames(packages_df, resources_df, organism_grouping_key):
+    """
+    Select the RNA-Seq fastq resources for an organism from the mapped
+    packages and mapped resources, and add the `sample.bpa_sample_id` column.
+    """
+    packages_df = packages_df.set_index("organism.organism_grouping_key")
+    resources_df = resources_df.set_index("experiment.bpa_package_id")
 
     # Only grab packages that we know are for rnaseq. This logic needs to be
     # moved.
     query_packages = packages_df.loc[
-        (packages_df.index == args.organism_grouping_key)
+        (packages_df.index == organism_grouping_key)
         & (packages_df["experiment.library_strategy"] == "RNA-Seq"),
         "experiment.bpa_package_id",
     ].tolist()
 
+    # Packages with no fastq resources aren't in the (pre-filtered) resources
+    query_packages = [x for x in query_packages if x in resources_df.index]
     all_query_resources = resources_df.loc[query_packages]
 
     # Subset the resources - keep only fastq with a read number. This logic
@@ -81,6 +136,135 @@ def main():
         how="left",
     )
 
+    return illumina_resources
+
+
+def all_organism_manifests(packages_df, resources_df):
+    """
+    The same selection as manifest_from_frames, applied to every organism at
+    once. Filters the full catalogue, merges once and yields
+    (organism_grouping_key, manifest) for each organism with RNAseq data.
+    """
+    # Keep the source row order, so each manifest matches the single-organism
+    # output.
+    packages_df = packages_df.assign(_package_row=range(len(packages_df)))
+    resources_df = resources_df.assign(_resource_row=range(len(resources_df)))
+
+    query_packages = packages_df.loc[
+        packages_df["experiment.library_strategy"] == "RNA-Seq",
+        ["organism.organism_grouping_key", "experiment.bpa_package_id", "_package_row"],
+    ]
+
+    illumina_resources = resources_df[
+        (resources_df["file_format"] == "fastq") & (resources_df["read_number"].notna())
+    ]
+
+    sample_ids = packages_df[
+        ["experiment.bpa_package_id", "sample.bpa_sample_id", "_package_row"]
+    ].rename(columns={"_package_row": "_sample_row"})
+
+    all_manifests = query_packages.merge(
+        illumina_resources, on="experiment.bpa_package_id", how="inner"
+    ).merge(sample_ids, on="experiment.bpa_package_id", how="left")
+
+    all_manifests = all_manifests.sort_values(
+        ["_package_row", "_resource_row", "_sample_row"]
+    )
+    manifest_columns = [
+        "experiment.bpa_package_id",
+        *(
+            x
+            for x in resources_df.columns
+            if x not in ("experiment.bpa_package_id", "_resource_row")
+        ),
+        "sample.bpa_sample_id",
+    ]
+
+    for organism_grouping_key, manifest in all_manifests.groupby(
+        "organism.organism_grouping_key", sort=True, observed=True
+    ):
+        yield organism_grouping_key, manifest[manifest_columns].reset_index(drop=True)
+
+
+def _write_manifest(manifest, manifest_path):
+    manifest.to_csv(manifest_path)
+    return manifest_path
+
+
+def write_all_organism_manifests(packages_df, resources_df, outdir, processes=1):
+    """Write {outdir}/{organism_grouping_key}.csv for every organism."""
+    outdir.mkdir(parents=True, exist_ok=True)
+    manifests = (
+        (manifest, Path(outdir, f"{str(key).replace('/', '_')}.csv"))
+        for key, manifest in all_organism_manifests(packages_df, resources_df)
+    )
+
+    # Writing is mostly formatting CSV text, which holds the GIL, so only
+    # processes help. Each frame is pickled to a worker, so only a few are
+    # submitted at a time, instead of a second copy of the catalogue.
+    if processes > 1:
+        written = []
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            pending = deque()
+            for x in manifests:
+                if len(pending) >= 2 * processes:
+                    written.append(pending.popleft().result())
+                pending.append(executor.submit(_write_manifest, *x))
+            written.extend(x.result() for x in pending)
+        return written
+
+    return [_write_manifest(*x) for x in manifests]
+
+
+def main():
+    # print version info
+    pkg_metadata = metadata("atol-genome-launcher")
+    pkg_name = pkg_metadata.get("Name")
+    pkg_version = pkg_metadata.get("Version")
+
+    logger = logging.getLogger(pkg_name)
+    logger.warning(f"{pkg_name} version {pkg_version}")
+
+    args = parse_arguments()
+
+    if args.store:
+        # Query the indexed store. This doesn't need pandas, which is most of
+        # the start-up time.
+        columns, rows = organism_rnaseq_resources(
+            args.store, args.organism_grouping_key
+        )
+        with open(args.manifest, "wt", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(["", *columns])
+            writer.writerows([i, *row] for i, row in enumerate(rows))
+        return
+
+    # Only keep the package columns we need, and the resources for RNA-Seq
+    # packages. The resources are filtered in chunks, so the whole catalogue
+    # is never in memory.
+    packages_df = read_packages(args.packages, engine=args.engine)
+    rnaseq_packages = packages_df["experiment.library_strategy"] == "RNA-Seq"
+    if not args.all_organisms:
+        rnaseq_packages &= (
+            packages_df["organism.organism_grouping_key"] == args.organism_grouping_key
+        )
+    resources_df = read_rnaseq_resources(
+        args.resources,
+        packages_df.loc[rnaseq_packages, "experiment.bpa_package_id"],
+        engine=args.engine,
+    )
+
+    if args.all_organisms:
+        written = write_all_organism_manifests(
+            packages_df, resources_df, args.all_organisms, args.processes
+        )
+        logger.warning(f"Wrote {len(written)} manifests to {args.all_organisms}")
+        return
+
+    illumina_resources = manifest_from_frames(
+        packages_df, resources_df, args.organism_grouping_key
+    )
+
     illumina_resources.to_csv(args.manifest)
 
 
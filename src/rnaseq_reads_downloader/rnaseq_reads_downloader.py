@@ -14,7 +14,16 @@ from snakemake.api import (
 from snakemake.logging import logger
 import argparse
 import pandas as pd
-import tempfile
+
+# The manifest columns that the workflow uses
+_MANIFEST_COLUMNS = [
+    "sample.bpa_sample_id",
+    "file_name",
+    "read_number",
+    "lane_number",
+    "file_checksum",
+    "bioplatforms_url",
+]
 
 
 def parse_arguments():
@@ -30,8 +39,14 @@ def parse_arguments():
     return parser.parse_args()
 
 
-def mung_manifest_file(manifest):
-    manifest_df = pd.read_csv(manifest)
+def mung_manifest(manifest):
+    """
+    Read the manifest and add the `sample_name`. Returns the rows as a list of
+    dicts, which is passed to the workflow in the config.
+    """
+    # Read the IDs as strings, so integer sample IDs aren't turned into floats
+    # when there are missing values.
+    manifest_df = pd.read_csv(manifest, usecols=_MANIFEST_COLUMNS, dtype=str)
 
     # Handle the bpa_sample_id. It seems to be a static number followed by an
     # integer identifier, but sometimes it's just the integer.
@@ -43,11 +58,11 @@ def mung_manifest_file(manifest):
 
     manifest_df["sample_name"] = "bpa_sample_id_" + bpa_sample_id_string.astype(str)
 
-    manifest_df.set_index(["sample_name", "read_number", "lane_number"], inplace=True)
-    manifest_file = tempfile.mkstemp(suffix=".csv")
-    manifest_df.to_csv(manifest_file[1])
+    # Missing values are None rather than NaN, so the records are plain
+    # Python objects.
+    manifest_df = manifest_df.astype(object).where(manifest_df.notna(), None)
 
-    return Path(manifest_file[1])
+    return manifest_df.to_dict("records")
 
 
 def main():
@@ -68,9 +83,9 @@ def main():
     else:
         raise FileNotFoundError("Could not find a Snakefile")
 
-    # configure the manifest file
-    munged_manifest = mung_manifest_file(args.manifest)
-    args._manifest = munged_manifest
+    # pass the munged manifest to the workflow in the config, so the Snakefile
+    # doesn't have to parse it again
+    args._manifest_records = mung_manifest(args.manifest)
 
     # configure the run
     config_settings = ConfigSettings(config=args.__dict__)
@@ -0,0 +1,32 @@
+from s3_upload.client import make_s3_client, rclone_remote_config
+from s3_upload.engine import ChecksumMismatchError, UploadEngine
+from s3_upload.fanout import FanOutEngine
+from s3_upload.inventory import RemoteInventory
+from s3_upload.ledger import UploadLedger
+from s3_upload.receipt_store import ReceiptStore, convert_legacy_receipt
+from s3_upload.receipts import (
+    make_member_receipt,
+    make_receipt,
+    read_receipts,
+    receipt_endpoint,
+    receipt_file_path,
+    receipt_line,
+)
+
+__all__ = [
+    "ChecksumMismatchError",
+    "FanOutEngine",
+    "ReceiptStore",
+    "RemoteInventory",
+    "UploadEngine",
+    "UploadLedger",
+    "convert_legacy_receipt",
+    "make_member_receipt",
+    "make_receipt",
+    "make_s3_client",
+    "rclone_remote_config",
+    "read_receipts",
+    "receipt_endpoint",
+    "receipt_file_path",
+    "receipt_line",
+]
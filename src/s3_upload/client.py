@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+"""S3 clients configured from the same environment variables as rclone."""
+
+from botocore.config import Config
+import boto3
+import os
+
+
+def rclone_remote_config(remote_name: str = "UPLOAD") -> dict[str, str]:
+    """
+    The settings for an rclone remote from the RCLONE_CONFIG_{remote_name}_*
+    environment variables, with lowercase keys, e.g. "endpoint".
+    """
+    prefix = f"RCLONE_CONFIG_{remote_name}_"
+    return {
+        k.removeprefix(prefix).lower(): v
+        for k, v in os.environ.items()
+        if k.startswith(prefix)
+    }
+
+
+def make_s3_client(
+    endpoint: str | None,
+    access_key_id: str | None,
+    secret_access_key: str | None,
+    region: str | None = None,
+    max_pool_connections: int = 10,
+):
+    """
+    A thread-safe S3 client with a connection pool of `max_pool_connections`.
+    Share one client between threads rather than making one per upload.
+    """
+    config = Config(
+        max_pool_connections=max_pool_connections,
+        retries={"max_attempts": 5, "mode": "standard"},
+        # Ceph and most other S3-compatible stores need path-style addressing
+        s3={"addressing_style": "path"},
+        # Only send the checksums we ask for. Some S3-compatible stores
+        # reject the default CRC32 trailers.
+        request_checksum_calculation="when_required",
+        response_checksum_validation="when_required",
+    )
+    return boto3.client(
+        "s3",
+        endpoint_url=endpoint,
+        aws_access_key_id=access_key_id,
+        aws_secret_access_key=secret_access_key,
+        region_name=region or "us-east-1",
+        config=config,
+    )
@@ -0,0 +1,729 @@
+#!/usr/bin/env python3
+
+"""
+An in-process S3 upload engine. One pooled client is shared by every upload,
+files are uploaded concurrently, and large files are sent as multipart
+uploads with several parts in flight. Files can be compressed on the way, in
+the same pass.
+"""
+
+from block_gzip import (
+    DEFAULT_BLOCK_SIZE,
+    DEFAULT_CODEC,
+    DEFAULT_LEVEL,
+    compress_blocks,
+)
+from botocore.exceptions import ClientError
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from s3_upload.client import make_s3_client, rclone_remote_config
+from s3_upload.inventory import RemoteInventory
+from s3_upload.ledger import UploadLedger, file_sha256
+from s3_upload.receipts import make_member_receipt, make_receipt, receipt_endpoint
+from s3_upload.resume import MultipartState
+from s3_upload.shards import tar_shard
+from s3_upload.throttle import AdaptiveLimit
+import base64
+import hashlib
+import io
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+MiB = 1024**2
+
+# S3 allows at most 10,000 parts, so the part size grows for very large files
+_MAX_PARTS = 10_000
+
+
+class ChecksumMismatchError(ValueError):
+    """The uploaded object's checksum doesn't match the local file."""
+
+
+def _b64(digest: bytes) -> str:
+    return base64.b64encode(digest).decode()
+
+
+def composite_checksums(part_digests: list[tuple[bytes, bytes]]) -> dict[str, str]:
+    """
+    The checksums S3 reports for a multipart object, from each part's
+    (sha256, md5) digests: the composite SHA-256 (a hash of the part hashes)
+    and the multipart ETag.
+    """
+    n_parts = len(part_digests)
+    sha256 = hashlib.sha256(b"".join(x[0] for x in part_digests)).digest()
+    md5 = hashlib.md5(b"".join(x[1] for x in part_digests)).hexdigest()
+    return {"sha256": f"{_b64(sha256)}-{n_parts}", "etag": f"{md5}-{n_parts}"}
+
+
+class _HashingReader:
+    """Hash a binary file object's contents as they are read."""
+
+    def __init__(self, f):
+        self._f = f
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self.sha256.update(data)
+        return data
+
+
+class UploadEngine:
+    """
+    Upload local files to a bucket. Each upload reads the file once, hashing
+    it while it is sent, and returns a receipt.
+
+    At most `max_concurrency` parts are in flight across all uploads, so
+    memory use is bounded by `part_size * max_concurrency`. With
+    `adaptive_concurrency`, the number of requests in flight is tuned below
+    that to the throughput observed during the run.
+
+    Every request carries the SHA-256 of its body, which the object store
+    checks on receipt. With `verify`, the finished object's checksum is then
+    compared to the local one. The engine keeps an inventory of the bucket,
+    from listings and from the responses to its uploads, so objects it
+    uploaded are verified without another request.
+
+    With a `resume_dir`, the state of each multipart upload is saved there as
+    its parts are sent. An upload that fails or is killed is left open in
+    the bucket, and the next upload to the same path resumes it, sending
+    only the missing parts.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint: str | None = None,
+        access_key_id: str | None = None,
+        secret_access_key: str | None = None,
+        region: str | None = None,
+        part_size: int = 64 * MiB,
+        max_concurrency: int = 8,
+        verify: bool = True,
+        compress_threads: int = 2,
+        compress_codec: str = DEFAULT_CODEC,
+        compress_level: int = DEFAULT_LEVEL,
+        compress_block_size: int = DEFAULT_BLOCK_SIZE,
+        adaptive_concurrency: bool = True,
+        resume_dir: Path | None = None,
+    ):
+        self.bucket = bucket
+        self.endpoint = endpoint
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.verify = verify
+        self.compress_threads = compress_threads
+        self.compress_codec = compress_codec
+        self.compress_level = compress_level
+        self.compress_block_size = compress_block_size
+        self._client_settings = {
+            "endpoint": endpoint,
+            "access_key_id": access_key_id,
+            "secret_access_key": secret_access_key,
+            "region": region,
+        }
+        self._client = None
+        self._part_pool = None
+        self._compress_pool = None
+        self._lock = threading.Lock()
+        self._part_slots = AdaptiveLimit(
+            max_concurrency, minimum=1 if adaptive_concurrency else max_concurrency
+        )
+        self._multipart_state = MultipartState(resume_dir) if resume_dir else None
+        self.inventory = RemoteInventory(bucket)
+        # Receipts of files this engine uploaded while another destination of
+        # a FanOutEngine failed, so a retry doesn't send them again
+        self._partial_uploads = {}
+
+    @classmethod
+    def from_rclone_env(cls, bucket: str, remote_name: str = "UPLOAD", **kwargs):
+        """An engine using the RCLONE_CONFIG_{remote_name}_* variables."""
+        remote = rclone_remote_config(remote_name)
+        return cls(
+            bucket,
+            endpoint=remote.get("endpoint"),
+            access_key_id=remote.get("access_key_id"),
+            secret_access_key=remote.get("secret_access_key"),
+            region=remote.get("region"),
+            **kwargs,
+        )
+
+    @property
+    def client(self):
+        # Created on first use, so dry runs don't need credentials.
+        with self._lock:
+            if self._client is None:
+                self._client = make_s3_client(
+                    **self._client_settings,
+                    max_pool_connections=self.max_concurrency * 2,
+                )
+                self._part_pool = ThreadPoolExecutor(
+                    self.max_concurrency, thread_name_prefix="upload_part"
+                )
+                self._compress_pool = ThreadPoolExecutor(
+                    self.compress_threads, thread_name_prefix="compress"
+                )
+            return self._client
+
+    def close(self):
+        for pool in (self._part_pool, self._compress_pool):
+            if pool is not None:
+                pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _part_size_for(self, size: int) -> int:
+        part_size = self.part_size
+        while size > part_size * _MAX_PARTS:
+            part_size *= 2
+        return part_size
+
+    def receipt(self, remote_path: str, sha256sum: str) -> dict:
+        return make_receipt(self.endpoint, self.bucket, str(remote_path), sha256sum)
+
+    def upload_file(
+        self,
+        local_path: Path,
+        remote_path: str,
+        compress: bool = False,
+        ledger: UploadLedger | None = None,
+        compression: dict | None = None,
+        deduplicate: bool = False,
+    ) -> dict:
+        """
+        Upload one file and return its receipt. With `compress`, the file is
+        compressed in parallel blocks on the way, and the receipt has the
+        checksum of the compressed object. The codec, level and block_size
+        come from `compression`, or the engine's settings for any that it
+        doesn't have. The source is read once and no temporary copy is
+        written.
+
+        The upload is recorded in `ledger`, if there is one. With
+        `deduplicate`, a file of at least part_size with the same content as
+        one in the ledger is copied from that object in the bucket, instead of
+        being uploaded.
+        """
+        local_path = Path(local_path)
+        client = self.client
+        stat_result = local_path.stat()
+        part_size = self._part_size_for(stat_result.st_size)
+
+        # copying only saves time for files of at least one part
+        if (
+            deduplicate
+            and ledger is not None
+            and stat_result.st_size >= self.part_size
+        ):
+            receipt = self._copy_duplicate(
+                local_path, stat_result, remote_path, compress, ledger
+            )
+            if receipt is not None:
+                return receipt
+
+        with open(local_path, "rb") as f:
+            if compress:
+                # the ledger needs the hash of the source, not the object
+                source = _HashingReader(f) if ledger is not None else f
+                chunks = self._compress_blocks(source, compression)
+            else:
+                chunks = iter(lambda: f.read(part_size), b"")
+            uploaded = self._upload_chunks(chunks, remote_path, part_size)
+
+        source_sha256 = (
+            source.sha256.hexdigest() if compress and ledger is not None else None
+        )
+        return self._finish_file(
+            local_path,
+            stat_result,
+            remote_path,
+            compress,
+            ledger,
+            source_sha256,
+            uploaded,
+        )
+
+    def _finish_file(
+        self,
+        local_path,
+        stat_result,
+        remote_path,
+        compress,
+        ledger,
+        source_sha256,
+        uploaded,
+    ) -> dict:
+        """
+        Verify an uploaded file, from _upload_chunks' result, record it in
+        `ledger` and return its receipt. `source_sha256` is the hash of a
+        compressed file's source.
+        """
+        sha256sum, expected, object_size = uploaded
+        if self.verify:
+            self.verify_object(remote_path, expected)
+
+        logger.info(f"Uploaded {local_path} to {self.bucket}/{remote_path}")
+        receipt = self.receipt(remote_path, sha256sum)
+        if ledger is not None:
+            ledger.record(
+                local_path,
+                stat_result,
+                source_sha256 or sha256sum,
+                compress,
+                object_size,
+                receipt,
+            )
+        return receipt
+
+    def _copy_duplicate(self, local_path, stat_result, remote_path, compress, ledger):
+        """
+        Copy an object with the same content as local_path to remote_path, in
+        the bucket, and return its receipt. None if there isn't one.
+        """
+        candidates = [
+            x
+            for x in ledger.duplicates(local_path, stat_result, compress)
+            if x["receipt"]["endpoint"] == receipt_endpoint(self.endpoint)
+        ]
+        if not candidates:
+            return None
+
+        source_sha256 = file_sha256(local_path)
+        for entry in candidates:
+            if entry["source_sha256"] != source_sha256:
+                continue
+            source = entry["receipt"]
+            if (
+                source["location_root"] == self.bucket
+                and source["location_path"] == str(remote_path)
+            ):
+                continue
+            # only copy objects compressed with the same codec
+            if compress and (
+                Path(source["location_path"]).suffix != Path(remote_path).suffix
+            ):
+                continue
+            # skip objects that a listing shows have been deleted
+            if (
+                source["location_root"] == self.bucket
+                and self.inventory.is_listed(source["location_path"])
+                and source["location_path"] not in self.inventory
+            ):
+                continue
+            try:
+                self.client.copy(
+                    {"Bucket": source["location_root"], "Key": source["location_path"]},
+                    self.bucket,
+                    str(remote_path),
+                )
+                if self.verify:
+                    head = self.client.head_object(
+                        Bucket=self.bucket, Key=str(remote_path)
+                    )
+                    if head["ContentLength"] != entry["object_size"]:
+                        raise ChecksumMismatchError(
+                            f"{self.bucket}/{remote_path} is {head['ContentLength']} "
+                            f"bytes, expected {entry['object_size']}"
+                        )
+                    self.inventory.record(
+                        str(remote_path), head["ContentLength"], head["ETag"]
+                    )
+            except ClientError as e:
+                # e.g. the object has been deleted since it was uploaded
+                logger.debug(f"Couldn't copy {source['location_path']}: {e}")
+                continue
+
+            logger.info(
+                f"Copied {source['location_root']}/{source['location_path']} to "
+                f"{self.bucket}/{remote_path}, which has the same content as "
+                f"{local_path}"
+            )
+            receipt = self.receipt(remote_path, source["sha256sum"])
+            ledger.record(
+                local_path,
+                stat_result,
+                source_sha256,
+                compress,
+                entry["object_size"],
+                receipt,
+            )
+            return receipt
+        return None
+
+    def upload_bytes(self, body: bytes, remote_path: str) -> dict:
+        """Upload a small object from memory and return its receipt."""
+        expected = self._put_object(body, remote_path)
+        if self.verify:
+            self.verify_object(remote_path, expected)
+        return self.receipt(remote_path, hashlib.sha256(body).hexdigest())
+
+    def upload_shard(
+        self,
+        members,
+        remote_path: str,
+        ledger: UploadLedger | None = None,
+        compression: dict[str, dict] | None = None,
+    ) -> list[dict]:
+        """
+        Pack (local_path, member_path, compress) members into a tar shard
+        and upload it, with its index as remote_path + ".index.json". The
+        tar is streamed to the bucket without a temporary file. Members are
+        compressed with their settings in `compression`, by member_path, or
+        the engine's settings.
+
+        Returns the receipts for the shard and the index, then one receipt
+        per member. Each member is recorded in `ledger`, if there is one.
+        """
+        # the compress pool is created with the client
+        self.client
+        index = []
+        sources = []
+        chunks = self._shard_chunks(members, compression, index, sources)
+        uploaded = self._upload_chunks(chunks, remote_path, self.part_size)
+        return self._finish_shard(
+            members, remote_path, ledger, index, sources, uploaded
+        )
+
+    def _shard_chunks(self, members, compression, index, sources):
+        return tar_shard(
+            members,
+            lambda data, member_path: self._compress_bytes(
+                data, (compression or {}).get(member_path)
+            ),
+            index,
+            sources,
+        )
+
+    def _finish_shard(
+        self, members, remote_path, ledger, index, sources, uploaded
+    ) -> list[dict]:
+        """
+        Verify an uploaded shard, upload its index and record its members in
+        `ledger`. Returns the receipts, as upload_shard does.
+        """
+        sha256sum, expected, object_size = uploaded
+        if self.verify:
+            self.verify_object(remote_path, expected)
+        shard_receipt = self.receipt(remote_path, sha256sum)
+
+        index_body = json.dumps({"shard": remote_path, "members": index}).encode()
+        index_receipt = self.upload_bytes(index_body, f"{remote_path}.index.json")
+
+        logger.info(
+            f"Uploaded {len(members)} files in {self.bucket}/{remote_path}"
+        )
+        member_receipts = [make_member_receipt(shard_receipt, x) for x in index]
+        if ledger is not None:
+            for member, (stat_result, source_sha256), receipt in zip(
+                members, sources, member_receipts
+            ):
+                ledger.record(
+                    member[0], stat_result, source_sha256, member[2], object_size, receipt
+                )
+        return [shard_receipt, index_receipt] + member_receipts
+
+    def _compress_blocks(self, f, compression: dict | None = None):
+        settings = {
+            "codec": self.compress_codec,
+            "level": self.compress_level,
+            "block_size": self.compress_block_size,
+            **(compression or {}),
+        }
+        return compress_blocks(
+            f,
+            level=settings["level"],
+            block_size=settings["block_size"],
+            executor=self._compress_pool,
+            threads=self.compress_threads,
+            codec=settings["codec"],
+        )
+
+    def _compress_bytes(self, data: bytes, compression: dict | None = None) -> bytes:
+        return b"".join(self._compress_blocks(io.BytesIO(data), compression))
+
+    def upload_files(self, uploads, max_files: int = 4, **kwargs):
+        """
+        Upload (local_path, remote_path) or (local_path, remote_path,
+        compress) tuples, `max_files` at a time, and yield their receipts in
+        the same order. Keyword arguments, like `ledger`, are passed to
+        upload_file.
+        """
+        with ThreadPoolExecutor(max_files, thread_name_prefix="upload_file") as pool:
+            futures = [pool.submit(self.upload_file, *x, **kwargs) for x in uploads]
+            for future in futures:
+                yield future.result()
+
+    def list_objects(self, prefix: str = "") -> RemoteInventory:
+        """
+        List every object under `prefix` into the engine's inventory, with
+        sub-prefixes listed concurrently, and return the inventory. It has a
+        dict's get and `in`, keyed by object key, with each object's size and
+        ETag.
+        """
+        return self.inventory.list(self.client, prefix, workers=self.max_concurrency)
+
+    def verify_object(self, remote_path: str, expected: dict[str, str]):
+        """
+        Compare the object's checksum with the `expected` sha256 (base64) and
+        etag. Uses the SHA-256 if the store reports one, otherwise the ETag.
+
+        Objects uploaded by this engine are checked against the checksum the
+        store returned for the upload, without another request. Others are
+        checked with one HEAD request.
+        """
+        cached = self.inventory.get(str(remote_path))
+        if cached is not None and cached["sha256"]:
+            head = {"ChecksumSHA256": cached["sha256"], "ETag": cached["etag"]}
+        else:
+            head = self.client.head_object(
+                Bucket=self.bucket, Key=str(remote_path), ChecksumMode="ENABLED"
+            )
+        remote_sha256 = head.get("ChecksumSHA256")
+        if remote_sha256:
+            # Multipart checksums may or may not have the "-{n_parts}" suffix
+            matches = remote_sha256.split("-")[0] == expected["sha256"].split("-")[0]
+            checksum = ("ChecksumSHA256", remote_sha256, expected["sha256"])
+        else:
+            remote_etag = head["ETag"].strip('"')
+            matches = remote_etag == expected["etag"]
+            checksum = ("ETag", remote_etag, expected["etag"])
+
+        if not matches:
+            raise ChecksumMismatchError(
+                f"{checksum[0]} of {self.bucket}/{remote_path} is {checksum[1]}, "
+                f"expected {checksum[2]}"
+            )
+        logger.debug(f"Verified {self.bucket}/{remote_path} with {checksum[0]}")
+
+    def _put_object(self, body: bytes, remote_path: str) -> dict[str, str]:
+        self._part_slots.acquire()
+        sent = 0
+        try:
+            sha256 = hashlib.sha256(body).digest()
+            response = self.client.put_object(
+                Bucket=self.bucket,
+                Key=str(remote_path),
+                Body=body,
+                ChecksumAlgorithm="SHA256",
+                ChecksumSHA256=_b64(sha256),
+            )
+            sent = len(body)
+            self._record_object(remote_path, len(body), response)
+        finally:
+            self._part_slots.release(sent)
+        return {"sha256": _b64(sha256), "etag": hashlib.md5(body).hexdigest()}
+
+    def _record_object(self, remote_path: str, size: int, response: dict):
+        # The checksum in the response is the one the store computed from
+        # what it received, so it can verify the upload without a HEAD
+        self.inventory.record(
+            str(remote_path),
+            size,
+            response.get("ETag", ""),
+            response.get("ChecksumSHA256"),
+        )
+
+    def _upload_part(self, upload_id, remote_path, part_number, body):
+        sent = 0
+        try:
+            # hashlib releases the GIL, so parts are hashed in parallel
+            sha256 = hashlib.sha256(body).digest()
+            md5 = hashlib.md5(body).digest()
+            response = self.client.upload_part(
+                Bucket=self.bucket,
+                Key=str(remote_path),
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=body,
+                ChecksumSHA256=_b64(sha256),
+            )
+            part = {
+                "PartNumber": part_number,
+                "ETag": response["ETag"],
+                "ChecksumSHA256": _b64(sha256),
+            }
+            sent = len(body)
+            if self._multipart_state is not None:
+                self._multipart_state.record_part(
+                    self.bucket, str(remote_path), part, md5.hex(), len(body)
+                )
+            return part, (sha256, md5)
+        finally:
+            self._part_slots.release(sent)
+
+    def _submit_part(self, upload_id, remote_path, part_number, body, sent_parts):
+        # Parts sent before the upload was interrupted are skipped if they
+        # haven't changed
+        sent_part = sent_parts.get(str(part_number))
+        if sent_part is not None:
+            sha256 = hashlib.sha256(body).digest()
+            if _b64(sha256) == sent_part["ChecksumSHA256"]:
+                future = Future()
+                future.set_result(
+                    (
+                        {
+                            "PartNumber": part_number,
+                            "ETag": sent_part["ETag"],
+                            "ChecksumSHA256": sent_part["ChecksumSHA256"],
+                        },
+                        (sha256, bytes.fromhex(sent_part["md5"])),
+                    )
+                )
+                return future
+
+        # Wait for a free slot, so at most max_concurrency parts are held in
+        # memory. The slot is released when the part has been sent.
+        self._part_slots.acquire()
+        try:
+            return self._part_pool.submit(
+                self._upload_part, upload_id, remote_path, part_number, body
+            )
+        except BaseException:
+            self._part_slots.release()
+            raise
+
+    def _create_multipart_upload(self, remote_path: str, part_size: int) -> str:
+        upload_id = self.client.create_multipart_upload(
+            Bucket=self.bucket,
+            Key=str(remote_path),
+            ChecksumAlgorithm="SHA256",
+        )["UploadId"]
+        if self._multipart_state is not None:
+            self._multipart_state.start(
+                self.bucket, str(remote_path), upload_id, part_size
+            )
+        return upload_id
+
+    def _abort_multipart_upload(self, remote_path: str, upload_id: str):
+        try:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=str(remote_path), UploadId=upload_id
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchUpload":
+                raise
+        if self._multipart_state is not None:
+            self._multipart_state.finish(self.bucket, str(remote_path))
+
+    def _resume_multipart_upload(self, remote_path: str, part_size: int):
+        """
+        The upload ID and sent parts of an interrupted upload to remote_path,
+        or (None, {}) if there isn't one to resume. Only parts that are still
+        in the bucket are resumed.
+        """
+        if self._multipart_state is None:
+            return None, {}
+        state = self._multipart_state.load(self.bucket, str(remote_path))
+        if state is None:
+            return None, {}
+        if state["part_size"] != part_size:
+            logger.info(f"Part size changed, restarting the upload to {remote_path}")
+            self._abort_multipart_upload(remote_path, state["upload_id"])
+            return None, {}
+
+        remote_parts = {}
+        paginator = self.client.get_paginator("list_parts")
+        try:
+            for page in paginator.paginate(
+                Bucket=self.bucket, Key=str(remote_path), UploadId=state["upload_id"]
+            ):
+                for x in page.get("Parts", []):
+                    remote_parts[str(x["PartNumber"])] = x["ETag"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchUpload":
+                raise
+            self._multipart_state.finish(self.bucket, str(remote_path))
+            return None, {}
+
+        sent_parts = {
+            k: v
+            for k, v in state["parts"].items()
+            if remote_parts.get(k, "").strip('"') == v["ETag"].strip('"')
+        }
+        self._multipart_state.resume(state, sent_parts)
+        logger.info(
+            f"Resuming the upload to {self.bucket}/{remote_path}, "
+            f"with {len(sent_parts)} parts already sent"
+        )
+        return state["upload_id"], sent_parts
+
+    def _upload_chunks(self, chunks, remote_path: str, part_size: int):
+        """
+        Upload an iterable of bytes, hashing it as it goes. Streams that fit
+        in one part are sent with put_object, and longer streams as a
+        multipart upload, without knowing the length in advance. An
+        interrupted multipart upload to remote_path is resumed.
+
+        Returns the hex SHA-256 of the stream, the checksums to verify the
+        object with and the object's size.
+        """
+        client = self.client
+        sha256 = hashlib.sha256()
+        size = 0
+        buffer = bytearray()
+        upload_id, sent_parts = self._resume_multipart_upload(remote_path, part_size)
+        futures = []
+        try:
+            for chunk in chunks:
+                sha256.update(chunk)
+                size += len(chunk)
+                buffer += chunk
+                # Only send a full part when more data follows it, so the end
+                # of the stream is always sent last.
+                while len(buffer) > part_size:
+                    if upload_id is None:
+                        upload_id = self._create_multipart_upload(
+                            remote_path, part_size
+                        )
+                    futures.append(
+                        self._submit_part(
+                            upload_id,
+                            remote_path,
+                            len(futures) + 1,
+                            bytes(buffer[:part_size]),
+                            sent_parts,
+                        )
+                    )
+                    del buffer[:part_size]
+
+            if upload_id is None:
+                expected = self._put_object(bytes(buffer), remote_path)
+                return sha256.hexdigest(), expected, size
+
+            futures.append(
+                self._submit_part(
+                    upload_id, remote_path, len(futures) + 1, bytes(buffer), sent_parts
+                )
+            )
+            parts, part_digests = zip(*(x.result() for x in futures))
+            response = client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=str(remote_path),
+                UploadId=upload_id,
+                MultipartUpload={"Parts": list(parts)},
+            )
+            self._record_object(remote_path, size, response)
+        except BaseException:
+            for future in futures:
+                if future.cancel():
+                    self._part_slots.release()
+            if upload_id is not None:
+                if self._multipart_state is None:
+                    self._abort_multipart_upload(remote_path, upload_id)
+                else:
+                    logger.warning(
+                        f"Upload to {self.bucket}/{remote_path} failed, "
+                        "leaving it to be resumed"
+                    )
+            raise
+
+        if self._multipart_state is not None:
+            self._multipart_state.finish(self.bucket, str(remote_path))
+
+        return sha256.hexdigest(), composite_checksums(part_digests), size
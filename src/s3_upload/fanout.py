@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+
+"""
+Upload each file to several buckets, on one or more endpoints, from a single
+read of the source.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from s3_upload.engine import UploadEngine, _HashingReader
+from s3_upload.ledger import UploadLedger
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# chunks waiting for each destination, so a slow one holds back the read by
+# at most this many chunks
+_QUEUE_CHUNKS = 2
+
+_END = object()
+
+
+class _Destination:
+    """One engine's side of the tee: a bounded queue it reads its chunks from."""
+
+    def __init__(self):
+        self.queue = queue.Queue(_QUEUE_CHUNKS)
+        self.failed = threading.Event()
+
+    def put(self, item):
+        # A destination that failed stops reading, so don't wait for it
+        while not self.failed.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def chunks(self):
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+class FanOutEngine:
+    """
+    Upload to every engine in `engines` at once. Each source file is read,
+    hashed and compressed once, and its chunks are passed to a concurrent
+    upload for each engine. Each engine keeps its own client, concurrency
+    limits, resume state and inventory, and gets its own receipt.
+
+    Methods take one ledger per engine, in the same order, and return one
+    receipt, or list of receipts, per engine. If some destinations fail, the
+    others are still verified and recorded before the first error is raised.
+    """
+
+    def __init__(self, engines: list[UploadEngine]):
+        self.engines = engines
+
+    @classmethod
+    def from_rclone_env(cls, destinations: list[tuple[str, str]], **kwargs):
+        """
+        An engine for each (remote_name, bucket) in `destinations`, using the
+        RCLONE_CONFIG_{remote_name}_* variables. With a `resume_dir`, each
+        destination after the first keeps its resume state in a subdirectory
+        named after its remote and bucket.
+        """
+        resume_dir = kwargs.pop("resume_dir", None)
+        engines = []
+        for i, (remote_name, bucket) in enumerate(destinations):
+            engine_resume_dir = resume_dir
+            if resume_dir is not None and i > 0:
+                engine_resume_dir = Path(resume_dir, f"{remote_name}.{bucket}")
+            engines.append(
+                UploadEngine.from_rclone_env(
+                    bucket, remote_name, resume_dir=engine_resume_dir, **kwargs
+                )
+            )
+        return cls(engines)
+
+    def close(self):
+        for engine in self.engines:
+            engine.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _tee(self, engines, chunks, remote_path, part_sizes):
+        """
+        Read `chunks` once and upload them to each engine concurrently.
+        Returns each engine's _upload_chunks result, or the exception it
+        raised.
+        """
+        destinations = [_Destination() for _ in engines]
+
+        def upload(engine, destination, part_size):
+            try:
+                return engine._upload_chunks(
+                    destination.chunks(), remote_path, part_size
+                )
+            except BaseException:
+                destination.failed.set()
+                raise
+
+        with ThreadPoolExecutor(len(engines), thread_name_prefix="fan_out") as pool:
+            futures = [
+                pool.submit(upload, *x) for x in zip(engines, destinations, part_sizes)
+            ]
+            try:
+                for chunk in chunks:
+                    if all(x.failed.is_set() for x in destinations):
+                        break
+                    for destination in destinations:
+                        destination.put(chunk)
+            except BaseException as e:
+                for destination in destinations:
+                    destination.put(e)
+                raise
+            else:
+                for destination in destinations:
+                    destination.put(_END)
+            finally:
+                results = []
+                for future in futures:
+                    try:
+                        results.append(future.result())
+                    except BaseException as e:
+                        results.append(e)
+        return results
+
+    @staticmethod
+    def _raise_first(results):
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    def upload_file(
+        self,
+        local_path: Path,
+        remote_path: str,
+        compress: bool = False,
+        ledgers: list[UploadLedger | None] | None = None,
+        compression: dict | None = None,
+        deduplicate: bool = False,
+    ) -> list[dict]:
+        """
+        Upload one file to every engine's bucket, reading it once, and return
+        the receipts. See UploadEngine.upload_file. With `deduplicate`, a
+        destination that already has an object with the same content copies
+        it, and the others are sent the file.
+
+        If some destinations fail, the others keep their receipts, and a retry
+        of the unchanged file only sends it to the ones that failed.
+        """
+        ledgers = ledgers or [None] * len(self.engines)
+        if len(self.engines) == 1:
+            return [
+                self.engines[0].upload_file(
+                    local_path,
+                    remote_path,
+                    compress,
+                    ledgers[0],
+                    compression,
+                    deduplicate,
+                )
+            ]
+
+        local_path = Path(local_path)
+        stat_result = local_path.stat()
+        source = (
+            str(local_path),
+            str(remote_path),
+            compress,
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+        )
+        receipts = [None] * len(self.engines)
+        for i, (engine, ledger) in enumerate(zip(self.engines, ledgers)):
+            # sent by an earlier try that failed for another destination
+            receipts[i] = engine._partial_uploads.get(source)
+            if (
+                receipts[i] is None
+                and deduplicate
+                and ledger is not None
+                and stat_result.st_size >= engine.part_size
+            ):
+                receipts[i] = engine._copy_duplicate(
+                    local_path, stat_result, remote_path, compress, ledger
+                )
+        pending = [i for i, x in enumerate(receipts) if x is None]
+        if not pending:
+            self._forget_partial_upload(source)
+            return receipts
+
+        engines = [self.engines[i] for i in pending]
+        # the pools are created with the clients
+        for engine in engines:
+            engine.client
+        part_sizes = [x._part_size_for(stat_result.st_size) for x in engines]
+        with open(local_path, "rb") as f:
+            if compress:
+                # the ledgers need the hash of the source, not the object
+                reader = _HashingReader(f)
+                chunks = engines[0]._compress_blocks(reader, compression)
+            else:
+                chunks = iter(lambda: f.read(part_sizes[0]), b"")
+            results = self._tee(engines, chunks, remote_path, part_sizes)
+
+        source_sha256 = reader.sha256.hexdigest() if compress else None
+        for j, (i, result) in enumerate(zip(pending, results)):
+            if isinstance(result, BaseException):
+                continue
+            try:
+                receipts[i] = self.engines[i]._finish_file(
+                    local_path,
+                    stat_result,
+                    remote_path,
+                    compress,
+                    ledgers[i],
+                    source_sha256,
+                    result,
+                )
+            except Exception as e:
+                results[j] = e
+
+        if None in receipts:
+            for engine, receipt in zip(self.engines, receipts):
+                if receipt is not None:
+                    engine._partial_uploads[source] = receipt
+            self._raise_first(results)
+        self._forget_partial_upload(source)
+        return receipts
+
+    def _forget_partial_upload(self, source):
+        for engine in self.engines:
+            engine._partial_uploads.pop(source, None)
+
+    def upload_shard(
+        self,
+        members,
+        remote_path: str,
+        ledgers: list[UploadLedger | None] | None = None,
+        compression: dict[str, dict] | None = None,
+    ) -> list[list[dict]]:
+        """
+        Pack members into a tar shard, once, and upload it with its index to
+        every engine's bucket. Returns the receipts from each engine, as
+        UploadEngine.upload_shard does.
+        """
+        ledgers = ledgers or [None] * len(self.engines)
+        if len(self.engines) == 1:
+            return [
+                self.engines[0].upload_shard(
+                    members, remote_path, ledgers[0], compression
+                )
+            ]
+
+        for engine in self.engines:
+            engine.client
+        index = []
+        sources = []
+        chunks = self.engines[0]._shard_chunks(members, compression, index, sources)
+        results = self._tee(
+            self.engines,
+            chunks,
+            remote_path,
+            [x.part_size for x in self.engines],
+        )
+        receipts = [
+            engine._finish_shard(members, remote_path, ledger, index, sources, result)
+            for engine, ledger, result in zip(self.engines, ledgers, results)
+            if not isinstance(result, BaseException)
+        ]
+        self._raise_first(results)
+        return receipts
+
+    def upload_files(self, uploads, max_files: int = 4, **kwargs):
+        """
+        Upload (local_path, remote_path) or (local_path, remote_path,
+        compress) tuples to every engine, `max_files` at a time, and yield
+        each file's receipts in the same order.
+        """
+        with ThreadPoolExecutor(max_files, thread_name_prefix="upload_file") as pool:
+            futures = [pool.submit(self.upload_file, *x, **kwargs) for x in uploads]
+            for future in futures:
+                yield future.result()
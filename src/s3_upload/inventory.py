@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+An in-memory inventory of the objects in a bucket, so planning, skipping
+unchanged files and verifying uploads don't need a request per object.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteInventory:
+    """
+    The key, size, ETag and SHA-256 of objects in a bucket.
+
+    Prefixes are listed once, with the listing split by "/" into
+    sub-prefixes that are listed concurrently. Objects are added or updated
+    as they are uploaded, with the checksums the object store returned. The
+    SHA-256 is only known for objects uploaded during the run, because
+    listings don't include it.
+    """
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+        self._objects = {}
+        self._listed_prefixes = []
+        self._lock = threading.Lock()
+
+    def list(self, client, prefix: str = "", workers: int = 8, split_depth: int = 2):
+        """
+        List every object under `prefix`. The first `split_depth` levels of
+        sub-prefixes are listed by `workers` threads at once, and each one's
+        pages are fetched in turn.
+        """
+
+        def list_level(level_prefix, depth):
+            paginator = client.get_paginator("list_objects_v2")
+            kwargs = {"Bucket": self.bucket, "Prefix": level_prefix}
+            if depth > 0:
+                kwargs["Delimiter"] = "/"
+            objects = {}
+            sub_prefixes = []
+            for page in paginator.paginate(**kwargs):
+                for x in page.get("Contents", []):
+                    objects[x["Key"]] = {
+                        "size": x["Size"],
+                        "etag": x["ETag"].strip('"'),
+                        "sha256": None,
+                    }
+                sub_prefixes.extend(
+                    (x["Prefix"], depth - 1) for x in page.get("CommonPrefixes", [])
+                )
+            return objects, sub_prefixes
+
+        objects = {}
+        n_requests = 0
+        with ThreadPoolExecutor(workers, thread_name_prefix="list_objects") as pool:
+            futures = [pool.submit(list_level, prefix, split_depth)]
+            while futures:
+                level_objects, sub_prefixes = futures.pop().result()
+                n_requests += 1
+                objects.update(level_objects)
+                futures.extend(pool.submit(list_level, *x) for x in sub_prefixes)
+
+        with self._lock:
+            for key in [x for x in self._objects if x.startswith(prefix)]:
+                del self._objects[key]
+            self._objects.update(objects)
+            self._listed_prefixes.append(prefix)
+        logger.debug(
+            f"Listed {len(objects)} objects under {self.bucket}/{prefix} "
+            f"in {n_requests} prefixes"
+        )
+        return self
+
+    def is_listed(self, key: str) -> bool:
+        """Whether `key` is under a listed prefix, so it's missing if it's absent."""
+        return any(key.startswith(x) for x in self._listed_prefixes)
+
+    def get(self, key: str, default=None) -> dict | None:
+        with self._lock:
+            return self._objects.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._objects
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def record(self, key: str, size: int, etag: str, sha256: str | None = None):
+        """Add or update an object, e.g. after uploading it."""
+        with self._lock:
+            self._objects[key] = {
+                "size": size,
+                "etag": etag.strip('"'),
+                "sha256": sha256,
+            }
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+"""
+A local record of uploaded files, so later runs only upload files that have
+changed or are missing from the bucket.
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(file_path: Path, block_size: int = 8 * 1024**2) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while block := f.read(block_size):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class UploadLedger:
+    """
+    Uploaded files keyed by local path, with the size, mtime and SHA-256 of
+    the source, the size of the object and its receipt.
+    """
+
+    def __init__(self, ledger_file: Path):
+        self.ledger_file = Path(ledger_file)
+        self._entries = self._read()
+        # local paths by source size, to find duplicates without hashing
+        # every file
+        self._by_size = {}
+        for local_path, entry in self._entries.items():
+            self._by_size.setdefault(entry["size"], set()).add(local_path)
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict[str, dict]:
+        if not self.ledger_file.is_file():
+            return {}
+        try:
+            with open(self.ledger_file, "rt") as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            logger.warning(f"Ignoring unreadable upload ledger {self.ledger_file}")
+            return {}
+
+    def save(self):
+        # Write to a temporary file and rename, so an interrupted run never
+        # leaves a partial ledger.
+        self.ledger_file.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.ledger_file.parent, suffix=".tmp"
+            )
+            with os.fdopen(fd, "wt") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.ledger_file)
+
+    def record(
+        self,
+        local_path: Path,
+        stat_result: os.stat_result,
+        source_sha256: str,
+        compress: bool,
+        object_size: int,
+        receipt: dict,
+    ):
+        """Record an upload. `stat_result` is the source's stat before upload."""
+        with self._lock:
+            previous = self._entries.get(str(local_path))
+            if previous is not None:
+                self._by_size[previous["size"]].discard(str(local_path))
+            self._by_size.setdefault(stat_result.st_size, set()).add(str(local_path))
+            self._entries[str(local_path)] = {
+                "size": stat_result.st_size,
+                "mtime_ns": stat_result.st_mtime_ns,
+                "source_sha256": source_sha256,
+                "compress": compress,
+                "object_size": object_size,
+                "receipt": receipt,
+            }
+
+    def duplicates(
+        self, local_path: Path, stat_result: os.stat_result, compress: bool
+    ) -> list[dict]:
+        """
+        Entries for other files, uploaded as whole objects, with the same
+        size and compress flag as local_path. Any of them may have the same
+        content; compare their source_sha256 to find out.
+        """
+        with self._lock:
+            return [
+                self._entries[x]
+                for x in sorted(self._by_size.get(stat_result.st_size, ()))
+                if x != str(local_path)
+                and self._entries[x]["compress"] == compress
+                and "member_path" not in self._entries[x]["receipt"]
+            ]
+
+    def unchanged_receipt(
+        self,
+        local_path: Path,
+        receipt: dict,
+        compress: bool,
+        remote_objects: dict[str, dict] | None = None,
+        prior_receipts: dict[str, dict] | None = None,
+    ) -> dict | None:
+        """
+        The previous receipt for local_path if it was uploaded to the same
+        place as `receipt` (without the sha256sum), hasn't changed and is
+        still in the bucket. Otherwise None.
+
+        For files packed in a shard, `receipt` has the member_path, and
+        only the keys it has are compared.
+
+        Files are compared by size and mtime, and only hashed if the mtime
+        changed. Files that aren't in the ledger but have a receipt in
+        `prior_receipts` (keyed by member_path or location_path) are hashed
+        and compared with it, unless they are compressed or packed.
+        """
+        location = {k: v for k, v in receipt.items() if k != "sha256sum"}
+        remote_path = receipt["location_path"]
+        stat_result = Path(local_path).stat()
+        entry = self._entries.get(str(local_path))
+
+        if entry is None:
+            return self._check_prior_receipt(
+                local_path,
+                stat_result,
+                location,
+                compress,
+                remote_objects,
+                prior_receipts or {},
+            )
+
+        previous = {k: entry["receipt"].get(k) for k in location}
+        if previous != location or entry["compress"] != compress:
+            return None
+        if remote_objects is not None:
+            remote = remote_objects.get(remote_path)
+            if remote is None or remote["size"] != entry["object_size"]:
+                return None
+        if stat_result.st_size != entry["size"]:
+            return None
+
+        if stat_result.st_mtime_ns != entry["mtime_ns"]:
+            if file_sha256(local_path) != entry["source_sha256"]:
+                return None
+            with self._lock:
+                entry["mtime_ns"] = stat_result.st_mtime_ns
+
+        return entry["receipt"]
+
+    def _check_prior_receipt(
+        self, local_path, stat_result, location, compress, remote_objects, prior_receipts
+    ):
+        remote_path = location["location_path"]
+        prior = prior_receipts.get(remote_path)
+        if prior is None or compress or remote_objects is None:
+            return None
+        if "member_path" in location:
+            return None
+        if {k: v for k, v in prior.items() if k != "sha256sum"} != location:
+            return None
+        remote = remote_objects.get(remote_path)
+        if remote is None or remote["size"] != stat_result.st_size:
+            return None
+
+        source_sha256 = file_sha256(local_path)
+        if source_sha256 != prior["sha256sum"]:
+            return None
+
+        self.record(
+            local_path, stat_result, source_sha256, compress, remote["size"], prior
+        )
+        return prior
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+"""
+Upload receipts in one SQLite database, instead of one file per upload.
+
+The database is in WAL mode, so readers don't block the uploads that add to
+it. Each add is one transaction, so a receipt is either stored completely or
+not at all. Receipts are indexed by location_path, sha256sum and endpoint, and
+by the stage and dataset they were uploaded for. Keep the database on a file
+system where all writers run on the same host, because WAL relies on shared
+memory.
+"""
+
+from pathlib import Path
+from s3_upload.receipts import receipt_endpoint, receipt_file_path, receipt_line
+import json
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+_RECEIPT_COLUMNS = [
+    "storage_type",
+    "endpoint",
+    "location_root",
+    "location_path",
+    "sha256sum",
+]
+_MEMBER_COLUMNS = ["member_path", "member_offset", "member_size"]
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS receipts (
+        storage_type TEXT NOT NULL,
+        endpoint TEXT,
+        location_root TEXT NOT NULL,
+        location_path TEXT NOT NULL,
+        sha256sum TEXT NOT NULL,
+        member_path TEXT,
+        member_offset INTEGER,
+        member_size INTEGER,
+        file_path TEXT NOT NULL,
+        stage TEXT,
+        dataset_id TEXT
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS receipts_file
+        ON receipts (ifnull(endpoint, ''), location_root, file_path);
+    CREATE INDEX IF NOT EXISTS receipts_location_path ON receipts (location_path);
+    CREATE INDEX IF NOT EXISTS receipts_sha256sum ON receipts (sha256sum);
+    CREATE INDEX IF NOT EXISTS receipts_endpoint ON receipts (endpoint);
+    CREATE INDEX IF NOT EXISTS receipts_stage ON receipts (stage, dataset_id);
+"""
+
+
+def convert_legacy_receipt(record: dict) -> dict:
+    """
+    A receipt in the current format from one in the old format, with bucket
+    and remote_path instead of location_root and location_path. A null
+    endpoint is recorded as "None", as result-file-uploader writes it.
+    """
+    if "location_path" in record:
+        return {**record, "endpoint": receipt_endpoint(record["endpoint"])}
+    return {
+        "storage_type": "s3",
+        "endpoint": receipt_endpoint(record["endpoint"]),
+        "location_root": record["bucket"],
+        "location_path": record["remote_path"],
+        "sha256sum": record["sha256sum"],
+    }
+
+
+class ReceiptStore:
+    """
+    Receipts from any number of uploads. Adding a receipt for a file that
+    already has one, at the same endpoint and root, replaces it. Safe to use
+    from several threads.
+
+    With `readonly`, the store is opened as immutable, so nothing is written
+    next to it, not even the WAL and shared-memory files. Receipts that are
+    only in the WAL of a writer that crashed aren't seen.
+    """
+
+    def __init__(self, store: Path, readonly: bool = False):
+        self.store = Path(store)
+        if readonly:
+            self._connection = sqlite3.connect(
+                f"{self.store.resolve().as_uri()}?mode=ro&immutable=1",
+                uri=True,
+                check_same_thread=False,
+            )
+        else:
+            self.store.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.store, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, receipts, stage: str | None = None, dataset_id: str | None = None):
+        """Add receipts in one transaction."""
+        columns = _RECEIPT_COLUMNS + _MEMBER_COLUMNS
+        columns += ["file_path", "stage", "dataset_id"]
+        rows = [
+            [x.get(k) for k in _RECEIPT_COLUMNS + _MEMBER_COLUMNS]
+            + [receipt_file_path(x), stage, dataset_id]
+            for x in receipts
+        ]
+        if not rows:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO receipts ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                rows,
+            )
+
+    def find(
+        self,
+        location_path: str | None = None,
+        sha256sum: str | None = None,
+        endpoint: str | None = None,
+        location_root: str | None = None,
+        file_path: str | None = None,
+        stage: str | None = None,
+        dataset_id: str | None = None,
+    ) -> list[dict]:
+        """
+        The receipts that match every argument that isn't None, ordered by
+        file path.
+        """
+        filters = {
+            "location_path": location_path,
+            "sha256sum": sha256sum,
+            "endpoint": endpoint,
+            "location_root": location_root,
+            "file_path": file_path,
+            "stage": stage,
+            "dataset_id": dataset_id,
+        }
+        filters = {k: v for k, v in filters.items() if v is not None}
+        where = " AND ".join(f"{k} = ?" for k in filters) or "1"
+        query = (
+            f"SELECT {', '.join(_RECEIPT_COLUMNS + _MEMBER_COLUMNS)} FROM receipts "
+            f"WHERE {where} ORDER BY file_path, location_root, endpoint"
+        )
+        with self._lock:
+            rows = self._connection.execute(query, list(filters.values())).fetchall()
+
+        n_columns = len(_RECEIPT_COLUMNS)
+        receipts = []
+        for row in rows:
+            receipt = dict(zip(_RECEIPT_COLUMNS, row[:n_columns]))
+            if row[n_columns] is not None:
+                receipt.update(zip(_MEMBER_COLUMNS, row[n_columns:]))
+            receipts.append(receipt)
+        return receipts
+
+    def export_jsonl(self, output_jsonl: Path, **filters) -> int:
+        """
+        Write the receipts that match `filters` (see find) as JSONL, and
+        return how many were written.
+        """
+        receipts = self.find(**filters)
+        with open(output_jsonl, "wt") as f:
+            for receipt in receipts:
+                f.write(receipt_line(receipt) + "\n")
+        return len(receipts)
+
+    def load_jsonl(
+        self,
+        receipts_jsonl: Path,
+        stage: str | None = None,
+        dataset_id: str | None = None,
+    ) -> int:
+        """
+        Bulk load a JSONL file of receipts, in the current or the old format,
+        in one transaction. Returns the number of receipts loaded.
+        """
+        receipts = []
+        with open(receipts_jsonl, "rt") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    receipts.append(convert_legacy_receipt(json.loads(line)))
+        self.add(receipts, stage=stage, dataset_id=dataset_id)
+        logger.info(f"Loaded {len(receipts)} receipts from {receipts_jsonl}")
+        return len(receipts)
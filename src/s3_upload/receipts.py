@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+"""Upload receipts, in the format written by result-file-uploader."""
+
+import json
+
+
+def receipt_endpoint(endpoint: str | None) -> str:
+    """
+    The endpoint as receipts record it. Without one, result-file-uploader
+    wrote the string "None", so receipts keep doing that.
+    """
+    return str(endpoint)
+
+
+def make_receipt(
+    endpoint: str | None, location_root: str, location_path: str, sha256sum: str
+) -> dict:
+    """A receipt for one uploaded object. The key order is part of the format."""
+    return {
+        "storage_type": "s3",
+        "endpoint": receipt_endpoint(endpoint),
+        "location_root": location_root,
+        "location_path": location_path,
+        "sha256sum": sha256sum,
+    }
+
+
+def make_member_receipt(shard_receipt: dict, member: dict) -> dict:
+    """
+    A receipt for a file packed in a shard. The location is the shard's, the
+    sha256sum is the file's, and the member keys say where its data is in the
+    shard.
+    """
+    return {
+        **shard_receipt,
+        "sha256sum": member["sha256sum"],
+        "member_path": member["path"],
+        "member_offset": member["offset"],
+        "member_size": member["size"],
+    }
+
+
+def receipt_file_path(receipt: dict) -> str:
+    """The path of the file a receipt is for: the member's for packed files."""
+    return receipt.get("member_path") or receipt["location_path"]
+
+
+def receipt_line(receipt: dict) -> str:
+    """The receipt as one line of JSON, without the trailing newline."""
+    return json.dumps(receipt)
+
+
+def read_receipts(receipts_jsonl) -> dict[str, dict]:
+    """
+    The receipts in a JSONL file, keyed by location_path, or by member_path
+    for files packed in shards.
+    """
+    receipts = {}
+    with open(receipts_jsonl, "rt") as f:
+        for line in f:
+            if line.strip():
+                receipt = json.loads(line)
+                receipts[receipt_file_path(receipt)] = receipt
+    return receipts
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""
+Persisted state of multipart uploads, so an interrupted upload can be resumed
+by a retry or a later run, sending only the parts that are missing.
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class MultipartState:
+    """
+    One journal per unfinished multipart upload, in `state_dir`. Its first
+    line is a JSON object with the upload ID and the part size, and each
+    completed part appends a line with its number, ETag, SHA-256 and MD5, so
+    recording a part costs the same however many came before. The journal is
+    compacted to the parts that are still in the bucket when the upload is
+    resumed, and removed when the upload is completed.
+
+    Hash state can't be saved, so a resumed upload reads and hashes the whole
+    source again, including the parts that were already sent. Only sending
+    is skipped: a part is skipped if its SHA-256 matches the recorded one,
+    so a source that changed in between is sent again where it differs.
+    """
+
+    def __init__(self, state_dir: Path):
+        self.state_dir = Path(state_dir)
+        self._lock = threading.Lock()
+
+    def _state_file(self, bucket: str, remote_path: str) -> Path:
+        key = hashlib.sha256(f"{bucket}/{remote_path}".encode()).hexdigest()
+        return Path(self.state_dir, f"{key}.jsonl")
+
+    def load(self, bucket: str, remote_path: str) -> dict | None:
+        """The saved state of the upload to bucket/remote_path, if there is one."""
+        state_file = self._state_file(bucket, remote_path)
+        if not state_file.is_file():
+            return None
+        with open(state_file, "rt") as f:
+            lines = f.read().splitlines()
+        try:
+            state = json.loads(lines[0])
+        except (IndexError, json.JSONDecodeError):
+            logger.warning(f"Ignoring unreadable upload state {state_file}")
+            return None
+        records = []
+        for i, line in enumerate(lines[1:], 2):
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A killed upload can leave its last line half written. That
+                # part is sent again.
+                if i < len(lines):
+                    logger.warning(f"Ignoring unreadable upload state {state_file}")
+                    return None
+        if state["bucket"] != bucket or state["remote_path"] != remote_path:
+            return None
+        state["parts"] = {str(x.pop("PartNumber")): x for x in records}
+        return state
+
+    def start(self, bucket: str, remote_path: str, upload_id: str, part_size: int):
+        state = {
+            "bucket": bucket,
+            "remote_path": remote_path,
+            "upload_id": upload_id,
+            "part_size": part_size,
+        }
+        with self._lock:
+            self._save(state, {})
+
+    def resume(self, state: dict, parts: dict[str, dict]):
+        """Continue recording a loaded upload, with the parts still in the bucket."""
+        header = {k: v for k, v in state.items() if k != "parts"}
+        with self._lock:
+            self._save(header, parts)
+
+    def record_part(
+        self, bucket: str, remote_path: str, part: dict, md5: str, size: int
+    ):
+        record = {
+            "PartNumber": part["PartNumber"],
+            "ETag": part["ETag"],
+            "ChecksumSHA256": part["ChecksumSHA256"],
+            "md5": md5,
+            "size": size,
+        }
+        state_file = self._state_file(bucket, remote_path)
+        # One write per line, so concurrent parts don't interleave
+        with self._lock:
+            # a part that finishes after the upload was aborted isn't kept
+            if state_file.is_file():
+                with open(state_file, "at") as f:
+                    f.write(json.dumps(record) + "\n")
+
+    def finish(self, bucket: str, remote_path: str):
+        """Forget a completed or aborted upload."""
+        with self._lock:
+            self._state_file(bucket, remote_path).unlink(missing_ok=True)
+
+    def _save(self, state: dict, parts: dict[str, dict]):
+        # Write to a temporary file and rename, so a killed upload never
+        # leaves a partial header.
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, suffix=".tmp")
+        with os.fdopen(fd, "wt") as f:
+            f.write(json.dumps(state) + "\n")
+            for number, x in parts.items():
+                f.write(json.dumps({"PartNumber": int(number), **x}) + "\n")
+        os.replace(tmp_path, self._state_file(state["bucket"], state["remote_path"]))
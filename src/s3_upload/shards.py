@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""
+Pack small files into tar shards, so they can be uploaded as one object.
+
+Each shard has an index with the offset, size and SHA-256 of every member's
+data in the tar, so a member can be read with one ranged GET.
+"""
+
+from pathlib import Path
+import hashlib
+import io
+import tarfile
+
+
+class _TarBuffer:
+    """A write-only file object that keeps what's written until it's taken."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _path_fraction(member_path: str) -> float:
+    """A number in [0, 1) that depends only on member_path."""
+    digest = hashlib.sha256(member_path.encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64
+
+
+def plan_shards(
+    files: list[tuple[Path, str, bool]], max_shard_size: int
+) -> dict[str, list[tuple[Path, str, bool]]]:
+    """
+    Split (local_path, member_path, compress) tuples into shards of at most
+    max_shard_size bytes of source data, in member_path order. Returns
+    {name: members}, with each shard named after its first member.
+
+    A shard ends after a member chosen by a hash of its path, with a chance
+    proportional to its size, so shards hold about an eighth of
+    max_shard_size on average. The boundaries don't depend on the other
+    files, so adding, removing or resizing a file only changes its own shard,
+    and the ones up to the next boundary if it fills one.
+    """
+    target_size = max(max_shard_size // 8, 1)
+    shards = []
+    shard_size = 0
+    end_shard = True
+    for member in sorted(files, key=lambda x: x[1]):
+        size = Path(member[0]).stat().st_size
+        if end_shard or shard_size + size > max_shard_size:
+            shards.append([])
+            shard_size = 0
+        shards[-1].append(member)
+        shard_size += size
+        end_shard = _path_fraction(member[1]) < size / target_size
+    return {
+        "shard_" + hashlib.sha256(x[0][1].encode()).hexdigest()[:16]: x
+        for x in shards
+    }
+
+
+def tar_shard(members, compress_data, index: list[dict], sources: list | None = None):
+    """
+    Yield a tar archive of (local_path, member_path, compress) members, as
+    bytes. Members with `compress` are stored as member_path, compressed
+    with compress_data(data, member_path). Each member's path, data offset,
+    size and SHA-256 are appended to `index`.
+
+    If there is a `sources` list, the stat and SHA-256 of each source file,
+    before compression, are appended to it as (stat_result, sha256) tuples.
+    """
+    buffer = _TarBuffer()
+    with tarfile.open(fileobj=buffer, mode="w", format=tarfile.PAX_FORMAT) as tar:
+        for local_path, member_path, compress in members:
+            stat_result = Path(local_path).stat()
+            with open(local_path, "rb") as f:
+                data = f.read()
+            if sources is not None:
+                sources.append((stat_result, hashlib.sha256(data).hexdigest()))
+            if compress:
+                data = compress_data(data, member_path)
+
+            tarinfo = tarfile.TarInfo(member_path)
+            tarinfo.size = len(data)
+            tarinfo.mtime = int(stat_result.st_mtime)
+            tar.addfile(tarinfo, io.BytesIO(data))
+
+            # the data ends the member, padded to a 512 byte block
+            data_offset = buffer.tell() - _padded(len(data))
+            index.append(
+                {
+                    "path": member_path,
+                    "offset": data_offset,
+                    "size": len(data),
+                    "sha256sum": hashlib.sha256(data).hexdigest(),
+                }
+            )
+            yield buffer.take()
+    yield buffer.take()
+
+
+def _padded(size: int) -> int:
+    blocks, remainder = divmod(size, tarfile.BLOCKSIZE)
+    return (blocks + (remainder > 0)) * tarfile.BLOCKSIZE
+
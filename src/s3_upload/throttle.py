@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+A concurrency limit for upload requests that follows the observed
+throughput.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimit:
+    """
+    A counting semaphore whose limit moves between `minimum` and `maximum`.
+
+    Each release reports the bytes sent. After every window of completed
+    requests, the limit takes one step. It keeps stepping the same way while
+    throughput improves by more than `tolerance`, and reverses if throughput
+    drops by more than that. When throughput stays flat it steps down, so
+    the limit settles at the fewest requests that reach the throughput the
+    uplink and the object store allow.
+
+    With `minimum == maximum` it is a plain semaphore.
+    """
+
+    def __init__(
+        self,
+        maximum: int,
+        minimum: int = 1,
+        initial: int | None = None,
+        min_window_seconds: float = 1.0,
+        tolerance: float = 0.05,
+    ):
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.limit = initial if initial is not None else max(self.minimum, maximum // 2)
+        self.min_window_seconds = min_window_seconds
+        self.tolerance = tolerance
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self._direction = 1
+        self._last_throughput = None
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._window_requests = 0
+
+    def acquire(self):
+        with self._condition:
+            while self._in_use >= self.limit:
+                self._condition.wait()
+            self._in_use += 1
+
+    def release(self, n_bytes: int = 0):
+        with self._condition:
+            self._in_use -= 1
+            self._window_bytes += n_bytes
+            self._window_requests += 1
+            self._adjust()
+            self._condition.notify_all()
+
+    def _adjust(self):
+        if self.minimum == self.maximum:
+            return
+        elapsed = time.monotonic() - self._window_start
+        # a window is at least one round of requests at the current limit
+        if self._window_requests < self.limit or elapsed < self.min_window_seconds:
+            return
+
+        throughput = self._window_bytes / elapsed
+        if self._last_throughput:
+            change = throughput / self._last_throughput - 1
+            if change < -self.tolerance:
+                self._direction = -self._direction
+            elif change <= self.tolerance:
+                self._direction = -1
+        limit = min(self.maximum, max(self.minimum, self.limit + self._direction))
+        if limit in (self.minimum, self.maximum) and limit == self.limit:
+            # bounce off the bounds, so the limit keeps probing
+            self._direction = -self._direction
+        if limit != self.limit:
+            logger.debug(
+                f"{throughput / 1024**2:.1f} MiB/s at {self.limit} requests, "
+                f"changing the limit to {limit}"
+            )
+        self.limit = limit
+        self._last_throughput = throughput
+        self._reset_window()
@@ -2,6 +2,7 @@
 
 from importlib import resources
 from pathlib import Path
+import re
 from snakemake.api import (
     SnakemakeApi,
     ConfigSettings,
@@ -21,18 +22,76 @@ def get_snakefile(package: str) -> Path:
     raise FileNotFoundError("Could not find a Snakefile")
 
 
+def path_constraint(paths, max_branches: int = 32) -> str:
+    """
+    Build a compact wildcard constraint that matches the paths in `paths`.
+
+    The paths are split into components and escaped into a trie. Levels with
+    more than `max_branches` distinct components are generalised to `[^/]+`,
+    so the constraint stays short however many paths there are. Snakemake
+    inlines constraints into every file pattern, so a "|"-joined list of
+    every path makes each job O(n). Exact membership should be checked with a
+    dict in the rule's input function.
+    """
+    split_paths = [tuple(x.split("/")) for x in set(str(x) for x in paths)]
+    if not split_paths:
+        # match nothing
+        return "(?!)"
+
+    def _trie_regex(remainders):
+        children = {}
+        for parts in remainders:
+            children.setdefault(parts[0], []).append(parts[1:])
+
+        if len(children) > max_branches:
+            merged = [x for rest in children.values() for x in rest]
+            branches = ["[^/]+" + _subtree_regex(merged)]
+        else:
+            branches = [
+                re.escape(k) + _subtree_regex(v) for k, v in sorted(children.items())
+            ]
+
+        return branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+
+    def _subtree_regex(remainders):
+        nonterminal = [x for x in remainders if x]
+        if not nonterminal:
+            return ""
+        optional = "?" if len(nonterminal) < len(remainders) else ""
+        return f"(?:/{_trie_regex(nonterminal)}){optional}"
+
+    return _trie_regex(split_paths)
+
+
 def run_workflow(
     snakefile: Path,
     config: dict,
     cores: int = 1,
     dry_run: bool = False,
     stdout: bool = False,
+    use_threads: bool = False,
+    resources: dict[str, int] | None = None,
+    keep_metadata: bool = True,
 ):
-    """Run a Snakemake workflow with the given configuration."""
+    """
+    Run a Snakemake workflow with the given configuration.
+
+    With use_threads, `run:` blocks are run in threads in this process rather
+    than in new Snakemake processes, so they can share objects such as
+    clients created when the Snakefile is parsed.
+
+    `resources` sets global limits on custom resources used by the rules,
+    like Snakemake's --resources.
+
+    Without keep_metadata, Snakemake doesn't write a metadata record for each
+    output file, for workflows that keep their own.
+    """
     config_settings = ConfigSettings(config=config)
-    resource_settings = ResourceSettings(cores=cores)
+    resource_settings = ResourceSettings(cores=cores, resources=resources or {})
     output_settings = OutputSettings(printshellcmds=True, stdout=stdout)
-    execution_settings = ExecutionSettings(lock=False)
+    execution_settings = ExecutionSettings(
+        lock=False, use_threads=use_threads, keep_metadata=keep_metadata
+    )
 
     with SnakemakeApi(output_settings) as snakemake_api:
         workflow_api = snakemake_api.workflow(
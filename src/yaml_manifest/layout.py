@@ -1,9 +1,18 @@
 """Standardised output directory structure loaded from config."""
 
 import json
-import gzip
-import shutil
-from fnmatch import fnmatch
+import os
+import re
+from block_gzip import (
+    CODEC_SUFFIXES,
+    DEFAULT_BLOCK_SIZE,
+    DEFAULT_CODEC,
+    DEFAULT_LEVEL,
+)
+from block_gzip import compress_file as _block_compress_file
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import translate
 from importlib import resources as importlib_resources
 from pathlib import Path
 
@@ -73,56 +82,179 @@ def get_pipeline_runscript(stage_name: str, **kwargs) -> Path:
     return Path(pipeline_runscript)
 
 
-def _is_excluded(file_path: Path, base_dir: Path, patterns: list[str]) -> bool:
-    """Check if a file matches any exclusion pattern."""
-    rel = str(file_path.relative_to(base_dir))
-    name = file_path.name
-    return any(fnmatch(rel, p) or fnmatch(name, p) for p in patterns)
+def _compile_patterns(patterns: list[str]) -> Callable[[str], bool]:
+    """One matcher for a list of fnmatch patterns."""
+    if not patterns:
+        return lambda _: False
+    regex = re.compile("|".join(translate(p) for p in patterns))
+    return lambda text: regex.match(text) is not None
 
 
-def _should_compress(file_path: Path, extensions: list[str]) -> bool:
-    """Check if a file should be compressed before upload."""
-    return any(file_path.name.endswith(ext) for ext in extensions)
+def _upload_rules(stage_name: str) -> dict:
+    """The stage's upload config, compiled into matchers for the directory walk."""
+    upload_config = get_stage(stage_name).get("upload", {})
+    exclude_patterns = upload_config.get("exclude_patterns", [])
+    compress_extensions = tuple(upload_config.get("compress_extensions", []))
+
+    # fnmatch's "*" also matches "/", so if a pattern ending in "*" matches a
+    # directory's relative path, it matches everything below it, and if it
+    # also starts with "*" the same goes for the directory name.
+    return {
+        "exclude": _compile_patterns(exclude_patterns),
+        "prune_path": _compile_patterns(
+            [p for p in exclude_patterns if p.endswith("*")]
+        ),
+        "prune_name": _compile_patterns(
+            [p for p in exclude_patterns if p.startswith("*") and p.endswith("*")]
+        ),
+        "compress": lambda name: name.endswith(compress_extensions),
+    }
+
+
+def _entry_is_dir(entry: os.DirEntry) -> bool | None:
+    # The same entries as Path.rglob, using the file type from scandir:
+    # symlinked directories aren't followed, symlinked files are kept.
+    if entry.is_dir(follow_symlinks=False):
+        return True
+    if entry.is_file():
+        return False
+    return None
+
+
+def _walk_upload_files(
+    path: str, rel: str, rules: dict, is_dir: bool = True
+) -> Iterator[tuple[str, Path]]:
+    """
+    Classify the files at or below `path`, depth first with each directory's
+    entries sorted by name, which is the same order as sorting the paths.
+    Excluded directories are yielded instead of the files in them.
+    """
+    # entries are pushed in reverse, so they are popped in order
+    stack = [(path, rel, is_dir)]
+    while stack:
+        path, rel, is_dir = stack.pop()
+        if not is_dir:
+            name = os.path.basename(path)
+            if rules["exclude"](rel) or rules["exclude"](name):
+                yield "exclude", Path(path)
+            elif rules["compress"](name):
+                yield "compress", Path(path)
+            else:
+                yield "upload", Path(path)
+            continue
+
+        if rel and (
+            rules["prune_path"](rel) or rules["prune_name"](os.path.basename(path))
+        ):
+            yield "exclude", Path(path)
+            continue
+
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda x: x.name)
+        for entry in reversed(entries):
+            is_dir = _entry_is_dir(entry)
+            if is_dir is not None:
+                entry_rel = f"{rel}/{entry.name}" if rel else entry.name
+                stack.append((entry.path, entry_rel, is_dir))
+
+
+def _iter_upload_files(
+    stage_name: str, output_dir: Path, workers: int = 1
+) -> Iterator[tuple[str, Path]]:
+    """Yield ("upload" | "compress" | "exclude", path) for each file in
+    output_dir, in sorted path order.
+
+    Excluded directories are skipped without being walked, and are yielded
+    as "exclude" in place of their files. With `workers` > 1, top-level
+    directories are walked in parallel threads, which helps on file systems
+    with slow metadata like Lustre.
+    """
+    output_dir = Path(output_dir)
+    if not output_dir.is_dir():
+        return
+    rules = _upload_rules(stage_name)
+
+    if workers <= 1:
+        yield from _walk_upload_files(str(output_dir), "", rules)
+        return
+
+    with os.scandir(output_dir) as it:
+        entries = sorted(it, key=lambda x: x.name)
+
+    def walk(entry):
+        is_dir = _entry_is_dir(entry)
+        if is_dir is None:
+            return []
+        return list(_walk_upload_files(entry.path, entry.name, rules, is_dir))
 
+    with ThreadPoolExecutor(workers, thread_name_prefix="collect_upload") as pool:
+        for result in pool.map(walk, entries):
+            yield from result
 
-def compress_file(file_path: Path) -> Path:
-    """Gzip a file in place, returning the path to the compressed file."""
-    gz_path = file_path.with_name(file_path.name + ".gz")
-    with open(file_path, "rb") as f_in:
-        with gzip.open(gz_path, "wb") as f_out:
-            shutil.copyfileobj(f_in, f_out)
-    return gz_path
+
+def get_stage_compression(stage_name: str, file_name: str) -> dict:
+    """The codec, level and block_size for compressing file_name at this stage.
+
+    The stage's upload config can set them in "compression", for all
+    files under "default" and for each extension under the extension. The
+    longest extension that file_name ends with wins, and settings it doesn't
+    have come from the default, then from block_gzip's defaults.
+    """
+    compression = get_stage(stage_name).get("upload", {}).get("compression", {})
+    settings = {
+        "codec": DEFAULT_CODEC,
+        "level": DEFAULT_LEVEL,
+        "block_size": DEFAULT_BLOCK_SIZE,
+        **compression.get("default", {}),
+    }
+    extensions = [x for x in compression if x != "default" and file_name.endswith(x)]
+    if extensions:
+        settings.update(compression[max(extensions, key=len)])
+    return settings
+
+
+def compressed_path(file_path: Path, codec: str = DEFAULT_CODEC) -> Path:
+    """The path of file_path compressed with codec, e.g. with .gz added."""
+    return file_path.with_name(file_path.name + CODEC_SUFFIXES[codec])
+
+
+def compress_file(
+    file_path: Path,
+    level: int = DEFAULT_LEVEL,
+    threads: int = 4,
+    bgzf: bool = False,
+    codec: str = DEFAULT_CODEC,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> Path:
+    """Compress a file in place, returning the path to the compressed file.
+
+    Blocks are compressed in parallel by `threads` threads. With `bgzf`, the
+    file is written as BGZF with a .gzi index next to it, so it can be read
+    at random, e.g. by samtools faidx. Pass a stage's settings with
+    `**get_stage_compression(stage_name, file_path.name)`.
+    """
+    gz_path = compressed_path(file_path, codec)
+    return _block_compress_file(
+        file_path, gz_path, level, threads, bgzf, codec=codec, block_size=block_size
+    )
 
 
 def _collect_upload_files(
     stage_name: str,
     output_dir: Path,
+    workers: int = 1,
 ) -> dict[str, list[Path]]:
     """Collect files from a pipeline output directory for upload.
 
     Returns a dict with keys:
         - "upload": files to upload as-is
         - "compress": files that need compression before upload
-        - "exclude": files that will be skipped
+        - "exclude": files that will be skipped, and excluded directories
+          that weren't walked
     """
-    stage = get_stage(stage_name)
-    upload_config = stage.get("upload", {})
-    exclude_patterns = upload_config.get("exclude_patterns", [])
-    compress_extensions = upload_config.get("compress_extensions", [])
-
     result = {"upload": [], "compress": [], "exclude": []}
-
-    for file_path in sorted(output_dir.rglob("*")):
-        if not file_path.is_file():
-            continue
-
-        if _is_excluded(file_path, output_dir, exclude_patterns):
-            result["exclude"].append(file_path)
-        elif _should_compress(file_path, compress_extensions):
-            result["compress"].append(file_path)
-        else:
-            result["upload"].append(file_path)
-
+    for category, file_path in _iter_upload_files(stage_name, output_dir, workers):
+        result[category].append(file_path)
     return result
 
 
@@ -3,10 +3,12 @@
 import json
 import re
 import yaml
+from collections.abc import Iterator
 from importlib import resources as importlib_resources
 from pathlib import Path
 from typing import Any, Optional
 from typing_extensions import deprecated
+from urllib.parse import urlsplit
 
 from pydantic import (
     BaseModel,
@@ -25,6 +27,7 @@ from yaml_manifest.layout import (
     get_pipeline_input,
     get_pipeline_runscript,
     _collect_upload_files,
+    _iter_upload_files,
 )
 
 _ASSEMBLY_TYPES_FILE = "assembly_types.json"
@@ -281,6 +284,23 @@ class BpaFile(BaseModel):
         """Extract compound file extension from URL (e.g., 'fastq.gz')."""
         return "".join(Path(self.url).suffixes).lstrip(".")
 
+    @property
+    def package_id(self) -> str:
+        """The CKAN package (dataset) that contains this resource."""
+        return self._url_part("dataset")
+
+    @property
+    def resource_id(self) -> str:
+        """The CKAN resource ID from the URL."""
+        return self._url_part("resource")
+
+    def _url_part(self, key: str) -> str:
+        parts = urlsplit(self.url).path.split("/")
+        try:
+            return parts[parts.index(key) + 1]
+        except (ValueError, IndexError):
+            raise ValueError(f"Couldn't find the {key} in URL {self.url}")
+
     @property
     def raw_path_suffix(self) -> Path:
         """
@@ -342,6 +362,13 @@ class ReadFile(BaseModel):
             raw_paths.extend(lf.raw_path for lf in lane_files)
         return raw_paths
 
+    @property
+    def all_bpa_files(self) -> list[BpaFile]:
+        bpa_files = []
+        for lane_files in self._iter_lane_file_lists():
+            bpa_files.extend(lane_files)
+        return bpa_files
+
     @property
     def all_lane_numbers(self) -> list[str]:
         lane_numbers = set()
@@ -494,6 +521,14 @@ class ReadFileCollection:
             raw_paths.extend(rf.all_raw_paths)
         return raw_paths
 
+    @property
+    def all_bpa_files(self) -> list[BpaFile]:
+        """All BpaFiles (CKAN resources) across all read files."""
+        bpa_files = []
+        for rf in self._read_files:
+            bpa_files.extend(rf.all_bpa_files)
+        return bpa_files
+
     def by_data_type(self, data_type: str) -> "ReadFileCollection":
         """Filter to a specific data type."""
         return ReadFileCollection(
@@ -539,6 +574,44 @@ class ReadFileCollection:
                         }
         raise KeyError(f"Raw path {raw_path} not found in any ReadFile")
 
+    def collected_path_index(self, stage: str = "raw") -> dict[Path, list[Path]]:
+        """Map each collected output for `stage` to its constituent lane paths.
+
+        Equivalent to calling collected_path_to_raw_paths for every path in
+        flat_paths(stage), but built in a single pass.
+        """
+        index = {}
+        for rf in self._read_files:
+            stage_paths = rf.paths(stage)
+            for read_number in rf.read_numbers:
+                # the first match wins, as in collected_path_to_raw_paths
+                index.setdefault(
+                    stage_paths[read_number],
+                    [
+                        bf.raw_path
+                        for bf in rf.lanes_for_read(read_number)
+                        if bf.raw_path is not None
+                    ],
+                )
+        return index
+
+    def lane_url_index(self) -> dict[Path, dict]:
+        """Map each raw_path to its download parameters (see lane_url)."""
+        index = {}
+        for rf in self._read_files:
+            for lane_files in rf._iter_lane_file_lists():
+                for bpa_file in lane_files:
+                    # the first match wins, as in lane_url
+                    index.setdefault(
+                        bpa_file.raw_path,
+                        {
+                            "url": bpa_file.url,
+                            "base_url": rf.base_url,
+                            "md5sum": bpa_file.md5sum,
+                        },
+                    )
+        return index
+
 
 class Manifest(BaseModel):
     """
@@ -871,9 +944,23 @@ have the same ToLID), they should have different assembly_versions.
     def get_stage_logs(self, stage: str) -> Path:
         return get_stage_logs(stage)
 
-    def collect_upload_files(self, stage: str) -> dict[str, list[Path]]:
+    def collect_upload_files(
+        self, stage: str, workers: int = 1
+    ) -> dict[str, list[Path]]:
         output_dir = self.get_dir("pipeline_output", pipeline=stage)
-        return _collect_upload_files(stage, output_dir)
+        return _collect_upload_files(stage, output_dir, workers)
+
+    def iter_upload_files(
+        self, stage: str, workers: int = 1, output_dir: Path | None = None
+    ) -> Iterator[tuple[str, Path]]:
+        """
+        Yield (category, path) for each file, without collecting them all.
+        `output_dir` replaces the stage's pipeline_output directory, e.g. for
+        testing.
+        """
+        if output_dir is None:
+            output_dir = self.get_dir("pipeline_output", pipeline=stage)
+        return _iter_upload_files(stage, output_dir, workers)
 
     def pipeline_input(self, stage: str) -> Path | dict[str, Path]:
         return get_pipeline_input(stage, **self.model_dump())